@@ -0,0 +1,505 @@
+#!/usr/bin/python3
+
+# Offline benchmarks for das2cat_cgi_browse.py, same license (MIT) as the
+# CGI script.
+#
+# A copy of a catalog tree (this repository's cat/ directory by default) is
+# served from a local stand-in HTTP server with an optional delay added to
+# every reply, and the browse script is pointed at it with a URL rewrite.
+# Three groups of timings are taken:
+#
+#    resolve  - getNode() for each node on the way down to a target path,
+#               with an empty cache, a warm disk cache and a warm in-memory
+#               cache
+#    render   - prnCatalog(), prnCollection() and prnHttpSource() for nodes
+#               that have already been fetched
+#    main     - Whole pages from main(), cold, with a warm node cache and
+#               from the page cache
+#
+# Results are written as JSON so that runs from different commits can be
+# compared, for example:
+#
+#    ./das2cat_bench.py -o before.json
+#    git checkout my_branch
+#    ./das2cat_bench.py -o after.json -c before.json
+
+import sys
+import os
+import io
+import json
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+import statistics
+import functools
+import http.server
+import urllib.parse
+
+import das2cat_cgi_browse as browse
+import das2cat_indexfile
+
+# The catalog tree is served under the same URLs as the public copy of this
+# repository, so node 'urls' don't have to be changed
+g_sRepoCat = "https://raw.githubusercontent.com/das-developers/das-cat/master/cat/"
+
+g_sDefTree = os.path.join(
+	os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cat'
+)
+
+# The CHEMS HAPI source, 278 on/off flags
+g_sDefTarget = "tag:das2.org,2012:site:/jhuapl/cassini/mimi/"+\
+               "chems_pha_box_fluxes_full_time_res/hapi"
+
+##############################################################################
+# Stand-in catalog server
+
+# Top level keys of older HttpStreamSrc nodes that now live under
+# 'protocol' and 'interface'
+g_tProtocolKeys = ('authentication', 'base_urls', 'http_params', 'examples')
+g_tInterfaceKeys = ('coordinates', 'data', 'options')
+
+def upgradeSource(dNode):
+	"""Move an older flat HttpStreamSrc node to the protocol/interface layout
+	read by prnHttpSource().  Plain string units become {'value':units}.
+	Other nodes are returned unchanged.
+	"""
+	if dNode.get('type') != 'HttpStreamSrc': return dNode
+	if ('protocol' in dNode) or ('base_urls' not in dNode): return dNode
+
+	dNode = dict(dNode)
+	dNode['protocol'] = {}
+	dNode['interface'] = {}
+	for sKey in g_tProtocolKeys:
+		if sKey in dNode: dNode['protocol'][sKey] = dNode.pop(sKey)
+	for sKey in g_tInterfaceKeys:
+		if sKey in dNode: dNode['interface'][sKey] = dNode.pop(sKey)
+
+	for sSection in ('coordinates', 'data'):
+		for dVar in dNode['interface'].get(sSection, {}).values():
+			if isinstance(dVar.get('units'), str):
+				dVar['units'] = {'value':dVar['units']}
+	return dNode
+
+
+def copyTree(sSrcDir, sDestDir):
+	"""Copy the JSON files of a catalog tree, upgrading older source nodes"""
+	for (sDir, lDirs, lFiles) in os.walk(sSrcDir):
+		sOutDir = os.path.join(sDestDir, os.path.relpath(sDir, sSrcDir))
+		os.makedirs(sOutDir, exist_ok=True)
+		for sFile in lFiles:
+			if not sFile.endswith('.json'): continue
+			with open(os.path.join(sDir, sFile), 'r', encoding='utf-8') as f:
+				dNode = json.load(f)
+			with open(os.path.join(sOutDir, sFile), 'w', encoding='utf-8') as f:
+				json.dump(upgradeSource(dNode), f, ensure_ascii=False, indent=1)
+
+
+class _CatHandler(http.server.SimpleHTTPRequestHandler):
+	"""Serves static files after the server's fLatency delay and counts the
+	requests and bytes sent
+	"""
+	def do_GET(self):
+		if self.server.fLatency > 0: time.sleep(self.server.fLatency)
+		with self.server.lock:
+			self.server.nRequests += 1
+		super().do_GET()
+
+	def copyfile(self, source, outputfile):
+		nBeg = source.tell()
+		super().copyfile(source, outputfile)
+		with self.server.lock:
+			self.server.nBytes += source.tell() - nBeg
+
+	def log_message(self, format, *args):
+		pass
+
+
+class CatServer(http.server.ThreadingHTTPServer):
+	"""Local stand-in for the upstream catalog hosts
+
+	Args:
+		sDir: The directory to serve
+		fLatency: Seconds to wait before answering each request
+	"""
+	daemon_threads = True
+
+	def __init__(self, sDir, fLatency=0.0):
+		self.fLatency = fLatency
+		self.lock = threading.Lock()
+		self.nRequests = 0
+		self.nBytes = 0
+		http.server.ThreadingHTTPServer.__init__(
+			self, ('127.0.0.1', 0), functools.partial(_CatHandler, directory=sDir)
+		)
+		self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+		self.thread.start()
+
+	def url(self):
+		return "http://127.0.0.1:%d/"%self.server_address[1]
+
+	def counts(self):
+		with self.lock:
+			return (self.nRequests, self.nBytes)
+
+	def stop(self):
+		self.shutdown()
+		self.server_close()
+
+
+##############################################################################
+# Browse script state
+
+def setupBrowse(server, sWorkDir):
+	"""Point the browse script at the stand-in server and keep all of it's
+	files under sWorkDir
+	"""
+	browse.g_lCatRoots = ["%sindex.json"%g_sRepoCat]
+	browse.g_lUrlRewrites = [ (g_sRepoCat, server.url()) ]
+	browse.g_sCacheDir = os.path.join(sWorkDir, 'cache')
+	browse.g_sPathIndex = os.path.join(sWorkDir, 'paths.jsonl')
+	browse.g_sSearchIndex = os.path.join(sWorkDir, 'search.json')
+	browse.g_nCacheTTL = 3600
+
+
+def resetBrowse(bDisk=False, bMemory=False):
+	"""Empty the browse script's caches
+
+	Args:
+		bDisk: Keep the disk cache (nodes, pages, host response times)
+		bMemory: Keep the in-memory node and page caches
+	"""
+	if not bDisk:
+		shutil.rmtree(browse.g_sCacheDir, ignore_errors=True)
+		browse.g_dHosts = None
+		browse.g_dFailedUrls = None
+
+	if bMemory:
+		browse.g_nNodeCacheSize = 1024
+		browse.g_nPageCacheSize = 256
+	else:
+		browse.g_nNodeCacheSize = 0
+		browse.g_nPageCacheSize = 0
+		with browse.g_lruLock:
+			browse.g_dNodeLru.clear()
+		with browse.g_pageLock:
+			browse.g_dPageLru.clear()
+
+	with browse.g_indexLock:
+		browse.g_dIndexFiles.clear()
+
+
+def _request(sQuery=""):
+	"""Start a request for the browse script, returns the output list"""
+	lOut = []
+	browse.beginRequest({
+		'SERVER_NAME':'localhost', 'SERVER_PORT':'80', 'SCRIPT_NAME':'/browse',
+		'PATH_INFO':'', 'REQUEST_METHOD':'GET', 'QUERY_STRING':sQuery
+	}, lOut)
+	return lOut
+
+
+def _form(sQuery):
+	import cgi
+	return cgi.FieldStorage(
+		fp=io.BytesIO(), environ={'REQUEST_METHOD':'GET', 'QUERY_STRING':sQuery}
+	)
+
+
+##############################################################################
+# Timing
+
+def timeIt(server, nRepeat, fnSetup, fnRun):
+	"""Time fnRun() nRepeat times, calling fnSetup() before each run.
+
+	Returns:
+		A result dictionary with run times in seconds, the number of requests
+		and bytes the stand-in server saw per run, and the output size if fnRun
+		returns a list of output text
+	"""
+	lSec = []
+	lReq = []
+	lBytes = []
+	nOut = None
+	for i in range(nRepeat):
+		fnSetup()
+		(nReq0, nBytes0) = server.counts()
+		fBeg = time.perf_counter()
+		ret = fnRun()
+		lSec.append(time.perf_counter() - fBeg)
+		(nReq1, nBytes1) = server.counts()
+		lReq.append(nReq1 - nReq0)
+		lBytes.append(nBytes1 - nBytes0)
+		if isinstance(ret, list): nOut = len(''.join(ret).encode('utf-8'))
+
+	dRes = {
+		'seconds':[round(f, 6) for f in lSec],
+		'min':round(min(lSec), 6), 'median':round(statistics.median(lSec), 6),
+		'mean':round(statistics.mean(lSec), 6), 'max':round(max(lSec), 6),
+		'requests':max(lReq), 'bytes':max(lBytes)
+	}
+	if nOut != None: dRes['output_bytes'] = nOut
+	return dRes
+
+
+def pathChain(sTarget):
+	"""Get the catalog paths of every node from the top of the tree down to
+	sTarget, not counting the root catalog
+	"""
+	lChain = []
+	(dNode, sUrl) = browse._fetchFirst(browse.g_lCatRoots)
+	sPath = ""
+	while (dNode != None) and (sPath != sTarget):
+		# Follow the longest child path that sTarget starts with
+		lSubs = [t for t in das2cat_indexfile.subEntries(dNode, sPath)
+		         if sTarget.startswith(t[1])]
+		if len(lSubs) == 0: break
+		(lUrls, sPath) = max(lSubs, key=lambda t: len(t[1]))
+		lChain.append(sPath)
+		(dNode, sUrl) = browse._fetchFirst(lUrls)
+
+	return lChain
+
+
+def benchResolve(server, nRepeat, lChain):
+	"""Time getNode() for each depth of lChain in each cache state"""
+	dResults = {}
+	for (sState, bDisk, bMemory) in (
+		('cold', False, False), ('disk', True, False), ('memory', True, True)
+	):
+		for (iDepth, sPath) in enumerate(lChain):
+			def run():
+				_request()
+				try:
+					(dNode, lPathTo, lTried) = browse.getNode(sPath)
+				finally:
+					browse.endRequest()
+				if dNode == None: raise ValueError("Couldn't resolve %s"%sPath)
+
+			def setup():
+				resetBrowse(bDisk, bMemory)
+				if bDisk: run()  # warm up
+
+			dRes = timeIt(server, nRepeat, setup, run)
+			dRes['path'] = sPath
+			dResults["resolve.%s.depth%d"%(sState, iDepth + 1)] = dRes
+
+	return dResults
+
+
+def benchRender(server, nRepeat, lChain):
+	"""Time the renderer for each node type found along lChain"""
+	dRenderers = {
+		'Catalog':browse.prnCatalog, 'Collection':browse.prnCollection,
+		'HttpStreamSrc':browse.prnHttpSource
+	}
+
+	resetBrowse(True, True)
+	dResults = {}
+	for sPath in lChain:
+		_request()
+		try:
+			(dNode, lPathTo, lTried) = browse.getNode(sPath)
+		finally:
+			browse.endRequest()
+		if dNode == None: raise ValueError("Couldn't resolve %s"%sPath)
+
+		# The first node of each type is the one nearest the top of the tree
+		sType = dNode.get('type')
+		if (sType not in dRenderers) or \
+		   any(sName.startswith("render.%s"%sType) for sName in dResults):
+			continue
+
+		lModes = [('', None)]
+		if sType == 'Collection': lModes = [('.lazy', True), ('.eager', False)]
+
+		for (sMode, bLazy) in lModes:
+			def run():
+				if bLazy != None: browse.g_bLazySources = bLazy
+				lOut = _request()
+				try:
+					dRenderers[sType](dNode)
+				finally:
+					browse.endRequest()
+					browse.g_bLazySources = True
+				return lOut
+
+			dRes = timeIt(server, nRepeat, lambda: None, run)
+			dRes['path'] = sPath
+			if sType == 'HttpStreamSrc': dRes['flags'] = _flagCount(dNode)
+			dResults["render.%s%s"%(sType, sMode)] = dRes
+
+	return dResults
+
+
+def _flagCount(dSrc):
+	nFlags = 0
+	dParams = dSrc.get('protocol', {}).get('http_params', {})
+	for sParam in dParams:
+		nFlags += len(dParams[sParam].get('flags', {}))
+	return nFlags
+
+
+def benchMain(server, nRepeat, lChain):
+	"""Time whole pages for the last node of each type along lChain"""
+	dLast = {}
+	resetBrowse(True, True)
+	for sPath in lChain:
+		_request()
+		try:
+			(dNode, lPathTo, lTried) = browse.getNode(sPath)
+		finally:
+			browse.endRequest()
+		if dNode != None: dLast[dNode['type']] = sPath
+
+	dResults = {}
+	for sType in sorted(dLast):
+		sQuery = "resolve=%s"%urllib.parse.quote(dLast[sType])
+
+		def run():
+			lOut = _request(sQuery)
+			try:
+				nRet = browse.main(_form(sQuery))
+			finally:
+				browse.endRequest()
+			if nRet != 0: raise ValueError("main() returned %s for %s"%(nRet, sQuery))
+			return lOut
+
+		for (sState, fnSetup) in (
+			('cold', lambda: resetBrowse(False, False)),
+			('nodes', lambda: (resetBrowse(True, True), _clearPages())),
+			('page', lambda: None)
+		):
+			resetBrowse(True, True)
+			run()
+			dRes = timeIt(server, nRepeat, fnSetup, run)
+			dRes['path'] = dLast[sType]
+			dResults["main.%s.%s"%(sType, sState)] = dRes
+
+	return dResults
+
+
+def _clearPages():
+	with browse.g_pageLock:
+		browse.g_dPageLru.clear()
+	shutil.rmtree(os.path.join(browse.g_sCacheDir, 'pages'), ignore_errors=True)
+
+
+##############################################################################
+def _commit():
+	"""The current git commit of this checkout, if there is one"""
+	try:
+		return subprocess.run(
+			['git', 'describe', '--always', '--dirty'], capture_output=True,
+			text=True, cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10
+		).stdout.strip() or None
+	except (OSError, subprocess.SubprocessError):
+		return None
+
+
+def compare(dOld, dNew, fTolerance):
+	"""Print median times of two runs side by side
+
+	Returns:
+		The names of benchmarks that got slower by more than fTolerance
+		(a fraction of the old time)
+	"""
+	lSlower = []
+	browse.perr("%-40s %12s %12s %8s"%("benchmark", "old ms", "new ms", "ratio"))
+	for sName in sorted(dNew['results']):
+		if sName not in dOld['results']: continue
+		fOld = dOld['results'][sName]['median']
+		fNew = dNew['results'][sName]['median']
+		fRatio = fNew / fOld if fOld > 0 else float('inf')
+		sMark = ""
+		if fRatio > 1.0 + fTolerance:
+			lSlower.append(sName)
+			sMark = " *"
+		browse.perr("%-40s %12.3f %12.3f %8.2f%s"%(
+		            sName, fOld*1000, fNew*1000, fRatio, sMark))
+	return lSlower
+
+
+def main(argv):
+	import argparse
+
+	psr = argparse.ArgumentParser(
+		description="Time catalog resolution and page rendering against a "+\
+		            "local stand-in catalog server"
+	)
+	psr.add_argument('-d', '--tree', default=g_sDefTree,
+		help="Catalog directory to serve in place of %s, "%g_sRepoCat+\
+		     "defaults to %(default)s")
+	psr.add_argument('-p', '--path', default=g_sDefTarget,
+		help="Catalog path to resolve down to, defaults to %(default)s")
+	psr.add_argument('-l', '--latency', type=float, default=0.0,
+		help="Seconds added to every reply from the stand-in server, "+\
+		     "defaults to %(default)s")
+	psr.add_argument('-n', '--repeat', type=int, default=5,
+		help="Number of timed runs of each benchmark, defaults to %(default)s")
+	psr.add_argument('-g', '--group', action='append', dest='lGroups',
+		choices=('resolve', 'render', 'main'),
+		help="Only run this group of benchmarks, may be given more than once")
+	psr.add_argument('-o', '--output',
+		help="Write results to this JSON file instead of standard output")
+	psr.add_argument('-c', '--compare',
+		help="Compare with the results of an earlier run")
+	psr.add_argument('-t', '--tolerance', type=float, default=0.25,
+		help="With --compare, exit with status 4 if any benchmark is more "+\
+		     "than this fraction slower, defaults to %(default)s")
+
+	opts = psr.parse_args(argv[1:])
+	lGroups = opts.lGroups if opts.lGroups else ['resolve', 'render', 'main']
+	nRepeat = max(opts.repeat, 1)
+
+	sWorkDir = tempfile.mkdtemp(prefix='das2cat_bench_')
+	try:
+		sServeDir = os.path.join(sWorkDir, 'cat')
+		copyTree(opts.tree, sServeDir)
+		server = CatServer(sServeDir, opts.latency)
+		try:
+			setupBrowse(server, sWorkDir)
+			resetBrowse()
+			lChain = pathChain(opts.path)
+			if (len(lChain) == 0) or (lChain[-1] != opts.path):
+				browse.perr("ERROR: Couldn't find %s under %s"%(opts.path, opts.tree))
+				return 3
+
+			dResults = {}
+			if 'resolve' in lGroups: dResults.update(benchResolve(server, nRepeat, lChain))
+			if 'render' in lGroups: dResults.update(benchRender(server, nRepeat, lChain))
+			if 'main' in lGroups: dResults.update(benchMain(server, nRepeat, lChain))
+		finally:
+			server.stop()
+	finally:
+		shutil.rmtree(sWorkDir, ignore_errors=True)
+
+	dRun = {
+		'version':1, 'generated':time.time(), 'commit':_commit(),
+		'python':sys.version.split()[0], 'tree':os.path.abspath(opts.tree),
+		'path':opts.path, 'latency':opts.latency, 'repeat':nRepeat,
+		'results':dResults
+	}
+
+	for sName in sorted(dResults):
+		dRes = dResults[sName]
+		browse.perr("%-40s %10.3f ms median %4d requests"%(
+		            sName, dRes['median']*1000, dRes['requests']))
+
+	sOut = json.dumps(dRun, indent=1, sort_keys=True)
+	if opts.output:
+		with open(opts.output, 'w', encoding='utf-8') as f:
+			f.write(sOut + "\n")
+	else:
+		print(sOut)
+
+	if opts.compare:
+		with open(opts.compare, 'r', encoding='utf-8') as f:
+			dOld = json.load(f)
+		if len(compare(dOld, dRun, opts.tolerance)) > 0: return 4
+
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
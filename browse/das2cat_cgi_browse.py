@@ -26,11 +26,21 @@
 # libraries.
 
 import sys
+import threading
 from os.path import basename as bname
 
+# Per-thread request state, filled in by beginRequest().  Page output is
+# collected here and sent all at once by the caller, see encodeResponse().
+# Outside of a request, output goes straight to stdout.
+g_req = threading.local()
+
 def pout(thing):
-	s = "%s\n"%thing
-	sys.stdout.buffer.write(s.encode('utf-8'))
+	lOut = getattr(g_req, 'lOut', None)
+	if lOut != None:
+		lOut.append("%s\n"%thing)
+	else:
+		s = "%s\n"%thing
+		sys.stdout.buffer.write(s.encode('utf-8'))
 
 
 def perr(thing):
@@ -38,18 +48,37 @@ def perr(thing):
 	sys.stderr.buffer.write(s.encode('utf-8'))
 
 
-# Get header out the door before anything can go wrong
-pout("Content-type: text/html; charset=utf-8\r\n\r")
-pout("<!DOCTYPE html>")
-pout("<html>")
-
 import os
 import cgi
 import cgitb
 
-cgitb.enable()
+# Nothing is sent until the page is complete, so if anything goes wrong
+# cgitb can still replace the whole response with a traceback
+if __name__ == '__main__':
+	cgitb.enable()
+
+import atexit
+import bisect
+import collections
+import collections.abc
+import concurrent.futures
+import gzip
+import hashlib
+import html
+import math
+import queue
+import re
+import stat
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+import weakref
+import zlib
 
 import requests
+import requests.adapters
+import urllib3
 import json
 
 # Toggle the hierarchy we wish to show with this copy of the browse tool
@@ -69,9 +98,166 @@ g_lCatRoots = [
 
 g_sDefDas2SiteTag = 'tag:das2.org,2012:%s'%g_sTree
 
+# Pages are gzip or deflate compressed, if the browser allows it and they
+# are at least g_nCompressMin bytes long
+g_nCompressLevel = 6
+g_nCompressMin = 1024
+
+# Catalog nodes are cached on disk by URL along with the validators (ETag,
+# Last-Modified) sent by the upstream server.  Nodes younger than
+# g_nCacheTTL seconds are used as-is, older ones are revalidated with a
+# conditional GET.  Set g_sCacheDir to None to turn off caching.  Cached
+# nodes and pages are sent out as-is, so the directory is only used if it
+# belongs to this user and no one else can write to it, see _cacheDir().
+g_sCacheDir = os.path.join(
+	tempfile.gettempdir(), 'das2cat_cache_%s'%(
+		os.geteuid() if hasattr(os, 'geteuid') else os.getenv('USERNAME', 'user')
+	)
+)
+g_nCacheTTL = 600
+
+# Number of parsed nodes to keep in memory between requests.  This only
+# helps long running processes, so it's off for plain CGI use.
+g_nNodeCacheSize = 0
+
+# Number of resolved catalog paths to remember, with their URLs and
+# breadcrumbs, so that later lookups start from the deepest known ancestor
+# instead of the root.  Entries are used for g_nCacheTTL seconds.  Also only
+# for long running processes.
+g_nLearnedPaths = 0
+
+# Rendered pages are kept in the cache directory along with the version
+# (ETag or content hash) of every node that went into them, and are re-sent
+# as long as none of those nodes have changed.  g_nPageCacheSize pages are
+# also held in memory by long running processes.
+g_bPageCache = True
+g_nPageCacheSize = 0
+
+# At most g_nPageDiskMax pages are kept in the cache directory, the oldest
+# ones are removed when there are more.  This is checked at most every
+# g_nPagePruneDelay seconds.
+g_nPageDiskMax = 10000
+g_nPagePruneDelay = 300
+
+# Catalog URLs starting with the first item of each pair are read from the
+# second item instead.  Targets may be http(s) URLs, file:// URLs or plain
+# directories.  For example, to serve this repository's catalog from a local
+# checkout with no network I/O for the das, test and spase sub-trees:
+#
+#  ("https://raw.githubusercontent.com/das-developers/das-cat/master/cat/",
+#   "/var/www/das-cat/cat/"),
+g_lUrlRewrites = [
+]
+
+# file:// URLs are only read if they point inside one of these directories
+# or a rewrite target directory, so that catalogs (or browser users) can't
+# read arbitrary files on this server
+g_lLocalDirs = [
+]
+
+# Max number of sub-nodes fetched at the same time by getDirectSubs, also
+# the max number of paths resolved at the same time by resolveMany
+g_nFetchThreads = 8
+
+# Max number of catalog paths accepted by a single bulk resolve request,
+# see _renderBulk
+g_nBulkMax = 1000
+
+# When a node is listed at more than one URL, mirrors are raced: if the
+# current mirror hasn't answered within g_fHedgeDelay seconds the next one
+# is started as well and the first good reply wins.  Set to None to try
+# mirrors strictly one after the other.  Mirrors are tried in order of their
+# measured response time, failed requests count as g_fFailPenalty seconds.
+g_fHedgeDelay = 0.5
+g_fFailPenalty = 10.0
+
+# Upstream connections are kept open and reused.  At most g_nPoolSize
+# requests are in flight to any one host, a request that finds them all busy
+# waits for one to finish, but no longer than it's own timeout.  Pools are
+# kept for the g_nPoolHosts most recently used hosts.  502-504 replies are
+# retried g_nRetries times, failed connections and timeouts are not.  Set
+# g_nPoolSize to 0 to open a new connection for every request, without any
+# limit.
+g_nPoolSize = 8
+g_nPoolHosts = 32
+g_nRetries = 1
+
+# Node downloads are abandoned once they pass this many bytes
+g_nMaxNodeBytes = 8*1024*1024
+
+# Upstream requests time out after the host's smoothed response time plus
+# four times it's mean deviation plus g_fTimeoutMargin seconds, kept
+# between g_fTimeoutMin and g_fTimeoutMax.  Hosts we haven't heard from yet
+# get g_fTimeoutMax.
+g_fTimeoutMin = 1.0
+g_fTimeoutMax = 10.0
+g_fTimeoutMargin = 0.5
+
+# After g_nBreakerFails failures in a row a host is skipped for
+# g_fBreakerDelay seconds, doubling with each further failure up to
+# g_fBreakerMaxDelay.  After that one request is let through to test it.
+g_nBreakerFails = 3
+g_fBreakerDelay = 30.0
+g_fBreakerMaxDelay = 900.0
+
+# URLs that fail aren't tried again for this many seconds.  A cached copy
+# is used in the mean time if there is one.
+g_nNegativeTTL = 60
+
+# Health is kept for at most g_nHostsMax hosts and g_nFailedMax failed URLs,
+# requests can name any URL so neither is left to grow.  The hosts used
+# least recently and the URLs due for a retry soonest are dropped first.
+g_nHostsMax = 1000
+g_nFailedMax = 10000
+
+# Host health is written to the cache directory right away when a host's
+# breaker opens or closes, otherwise at most every g_fHostSaveDelay seconds
+# and when the process exits.
+g_fHostSaveDelay = 30.0
+
+# Each page gets this many seconds to read upstream nodes.  Once the time is
+# up, nodes are only read from the cache and whatever has been found so far
+# is shown, with a note about what is missing.  Set to None for no limit.
+g_fPageBudget = 8.0
+
+# Catalog and Collection keys needed to walk through a node to it's
+# children.  These are saved with each cached node so that the nodes above
+# the one being shown don't have to be read and parsed in full.
+g_tNavKeys = ('type', 'name', 'title', 'separator')
+
+# Optional flat index of catalog paths written by das2cat_index.py.  When
+# present getNode jumps straight to the wanted node instead of walking down
+# from the root.  Indexes older than g_nPathIndexMaxAge seconds are ignored.
+# The index is one sorted line per path, lookups binary search the file
+# instead of reading all of it.
+g_sPathIndex = os.path.join(g_sCacheDir, 'paths.jsonl')
+g_nPathIndexMaxAge = 7*24*3600
+
+# Optional full text search index written by das2cat_crawl.py.  The search
+# box is only shown if this file can be read.
+g_sSearchIndex = os.path.join(g_sCacheDir, 'search.json')
+
 # prepend the same protocol (http or https) as the script was called under
 g_sStyleSheet = "://das2.org/cat_resource/style.css"
 g_sLogo       = "://das2.org/cat_resource/das2logo_rv.png"
+g_sScript     = "://das2.org/cat_resource/das2cat.js"
+
+# Sources with at least this many coordinates or data variables that can
+# only be switched on and off (typical for HAPI) send those variables to the
+# browser as a list which das2cat.js draws on demand, with a filter box,
+# instead of writing a checkbox row for each one.  Set to 0 to turn off.
+g_nVarListMin = 24
+
+# Collection pages list their sources without fetching them, each source
+# form is loaded from the browse script (?fragment=source) when it's opened.
+# Set to False to fetch and render every source up front.
+g_bLazySources = True
+
+# Each request is timed phase by phase, see endRequest().  The totals are
+# sent in a Server-Timing header and a JSON record for the request, which
+# includes every upstream fetch, is appended to g_sRequestLog.  Use '-' for
+# standard error or None to turn off the log.
+g_sRequestLog = None
 
 
 #############################################################################
@@ -79,28 +265,396 @@ def _missingKeyError(sKey, sUrl):
 	pout(
 '''<p class="error">Format error in node from <a href="%s">%s</a>, 
 key <b>%s</b> is missing.</p>
-'''%(sKey, sUrl))
+'''%(sUrl, sUrl, sKey))
 	return None
 
 
+#############################################################################
+def beginRequest(dEnviron, lOut):
+	"""Setup the calling thread to handle a request.
+
+	Args:
+		dEnviron: A dictionary of CGI style request variables, ex: SCRIPT_NAME,
+			PATH_INFO, SERVER_NAME.  Used instead of the process environment.
+		lOut: A list that receives output text instead of stdout
+	"""
+	g_req.environ = dEnviron
+	g_req.lOut = lOut
+	g_req.sScriptUrl = None
+	g_req.lDeps = []
+	g_req.bIncomplete = False
+
+	g_req.fStart = time.time()
+	g_req.fBeg = time.perf_counter()
+	g_req.dPhases = {}
+	g_req.lFetches = []
+	g_req.nRet = None
+	g_req.sPageCache = None
+
+	g_req.fDeadline = None
+	if g_fPageBudget != None: g_req.fDeadline = time.time() + g_fPageBudget
+	g_req.lLate = []
+	g_req.lReached = []
+	g_req.sType = "text/html; charset=utf-8"
+
+def endRequest():
+	"""Finish the calling thread's request
+
+	Returns:
+		The request record, or None if no request was in progress.  This
+		has the time taken by each phase in 'phases', a record for each node
+		read in 'fetches' and per-host totals for those in 'hosts'.  The
+		Content-Type of the output is in 'type'.  The record is also written
+		to g_sRequestLog.
+	"""
+	if not hasattr(g_req, 'fBeg'):
+		g_req.__dict__.clear()
+		return None
+
+	fTotal = time.perf_counter() - g_req.fBeg
+	with g_timingLock:
+		dPhases = dict(g_req.dPhases)
+		lFetches = list(g_req.lFetches)
+		lLate = list(g_req.lLate)
+
+	# Whatever isn't accounted for is page generation
+	fOther = sum(dPhases.get(s, 0.0) for s in ('page', 'resolve', 'subs'))
+	dPhases['render'] = max(fTotal - fOther, 0.0)
+	dPhases['total'] = fTotal
+
+	dHosts = {}
+	for dFetch in lFetches:
+		dHost = dHosts.setdefault(dFetch['host'], {'fetches':0, 'seconds':0.0})
+		dHost['fetches'] += 1
+		dHost['seconds'] += dFetch['seconds']
+
+	dRec = {
+		'time':round(g_req.fStart, 3), 'path':_getenv('PATH_INFO') or '',
+		'query':_getenv('QUERY_STRING') or '', 'ret':g_req.nRet,
+		'page_cache':g_req.sPageCache,
+		'incomplete':g_req.bIncomplete or (len(lLate) > 0),
+		'late':lLate, 'type':g_req.sType,
+		'bytes':sum(len(s) for s in g_req.lOut),
+		'phases':dict((s, round(dPhases[s], 6)) for s in dPhases),
+		'fetches':lFetches, 'hosts':dHosts
+	}
+	g_req.__dict__.clear()
+
+	_count('das2cat_requests_total')
+	_observe('das2cat_request_seconds', (), fTotal)
+	_logRequest(dRec)
+	return dRec
+
+g_timingLock = threading.Lock()
+g_logLock = threading.Lock()
+
+def _addTime(sPhase, fSec):
+	"""Add to the time spent in a phase of the current request, if any"""
+	dPhases = getattr(g_req, 'dPhases', None)
+	if dPhases == None: return
+	with g_timingLock:
+		dPhases[sPhase] = dPhases.get(sPhase, 0.0) + fSec
+
+def _noteFetch(sUrl, dInfo, fSec):
+	"""Record a node read in the metrics and for the current request, see
+	_fetchNode()
+	"""
+	sHost = _urlHost(_rewriteUrl(sUrl)) or 'local'
+	sLabel = _metricHost(sHost)
+	_count('das2cat_node_reads_total', (('cache', dInfo.get('cache', 'none')),))
+	if 'http' in dInfo:
+		_observe('das2cat_upstream_seconds', (('host', sLabel),), dInfo['http'])
+	if 'bytes' in dInfo:
+		_count('das2cat_upstream_bytes_total', (('host', sLabel),), dInfo['bytes'])
+	if dInfo.get('cache') == 'failed':
+		sUrlLabel = sUrl if sLabel == sHost else 'other'
+		_count('das2cat_node_errors_total', (('url', sUrlLabel),))
+
+	lFetches = getattr(g_req, 'lFetches', None)
+	if lFetches == None: return
+
+	dFetch = {'url':sUrl, 'host':sHost, 'seconds':round(fSec, 6)}
+	for sKey in ('cache', 'status', 'bytes', 'wait', 'error'):
+		if sKey in dInfo: dFetch[sKey] = dInfo[sKey]
+	with g_timingLock:
+		lFetches.append(dFetch)
+
+def _inRequest():
+	"""True if the calling thread is handling a request, see beginRequest()"""
+	return hasattr(g_req, 'fBeg')
+
+def _timeLeft():
+	"""Seconds left before the current request's deadline, None if there's
+	no deadline.  See g_fPageBudget.
+	"""
+	fDeadline = getattr(g_req, 'fDeadline', None)
+	if fDeadline == None: return None
+	return fDeadline - time.time()
+
+def _noteLate(sUrl):
+	"""Record a node that wasn't read because the request ran out of time"""
+	lLate = getattr(g_req, 'lLate', None)
+	if lLate == None: return
+	with g_timingLock:
+		lLate.append(sUrl)
+	_count('das2cat_late_nodes_total')
+
+def _isLate():
+	return len(getattr(g_req, 'lLate', [])) > 0
+
+def _withRequest(fn):
+	"""Wrap a function so that it runs with the calling thread's request
+	state, for handing work to thread pools.  The state is shared, not
+	copied, so worker threads add to the same output, dependency and timing
+	lists.
+	"""
+	dState = dict(g_req.__dict__)
+
+	def run(*args):
+		g_req.__dict__.update(dState)
+		try:
+			return fn(*args)
+		finally:
+			g_req.__dict__.clear()
+	return run
+
+def serverTiming(dRec):
+	"""Format the phase times of a request record as a Server-Timing header
+	value, times are in milliseconds.
+	"""
+	dDesc = {
+		'page':'page cache', 'resolve':'catalog resolution',
+		'subs':'sub-node fetches', 'render':'page generation',
+		'fetch':'upstream reads, all threads', 'parse':'JSON parsing, all threads',
+		'total':'total'
+	}
+	lItems = []
+	for sPhase in ('page', 'resolve', 'subs', 'render', 'fetch', 'parse', 'total'):
+		if sPhase not in dRec['phases']: continue
+		lItems.append('%s;dur=%.1f;desc="%s"'%(
+		              sPhase, dRec['phases'][sPhase]*1000, dDesc[sPhase]))
+	return ", ".join(lItems)
+
+def _logRequest(dRec):
+	if not g_sRequestLog: return
+
+	sLine = "%s\n"%json.dumps(dRec, ensure_ascii=False, sort_keys=True)
+	with g_logLock:
+		if g_sRequestLog == '-':
+			sys.stderr.write(sLine)
+			sys.stderr.flush()
+			return
+		# One write per record in append mode, so records from concurrent
+		# CGI processes don't interleave
+		try:
+			with open(g_sRequestLog, 'a', encoding='utf-8') as f:
+				f.write(sLine)
+		except OSError as e:
+			perr("WARNING: Couldn't write request log %s, %s"%(g_sRequestLog, e))
+
+#############################################################################
+# In-process metrics for long running servers, see metricsText().  Updates
+# are a dictionary lookup and an add under a lock.
+
+# Upper bounds of the histogram buckets, in seconds
+g_tTimeBuckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+g_dMetricInfo = {
+	'das2cat_requests_total':('counter', "Pages and fragments served"),
+	'das2cat_request_seconds':('histogram', "Time to produce a response"),
+	'das2cat_page_cache_total':('counter', "Rendered page cache lookups by result"),
+	'das2cat_learned_paths_total':('counter', "Catalog lookups started from a learned ancestor, by result"),
+	'das2cat_node_reads_total':('counter', "Catalog node reads by cache outcome"),
+	'das2cat_nodes_parsed_total':('counter', "Catalog node JSON bodies parsed"),
+	'das2cat_upstream_seconds':('histogram', "Upstream catalog request time by host"),
+	'das2cat_upstream_bytes_total':('counter', "Catalog node bytes read by host"),
+	'das2cat_node_errors_total':('counter', "Failed catalog node reads by URL"),
+	'das2cat_render_seconds':('histogram', "Page generation time by node type"),
+	'das2cat_fetches_skipped_total':('counter', "Upstream requests not made because the URL failed recently or the host is down"),
+	'das2cat_breaker_opened_total':('counter', "Times a host was marked down"),
+	'das2cat_late_nodes_total':('counter', "Nodes not read because the page ran out of time"),
+}
+
+# (name, labels) -> value for counters, or a list of bucket counts followed
+# by the sum and count for histograms
+g_dMetrics = {}
+g_metricLock = threading.Lock()
+
+def _count(sName, tLabels=(), nInc=1):
+	"""Add to a counter, tLabels is a tuple of (label, value) pairs"""
+	with g_metricLock:
+		g_dMetrics[(sName, tLabels)] = g_dMetrics.get((sName, tLabels), 0) + nInc
+
+def _observe(sName, tLabels, fValue):
+	"""Add a value to a histogram"""
+	iBucket = bisect.bisect_left(g_tTimeBuckets, fValue)
+	with g_metricLock:
+		lHist = g_dMetrics.get((sName, tLabels))
+		if lHist == None:
+			lHist = [0]*(len(g_tTimeBuckets) + 3)
+			g_dMetrics[(sName, tLabels)] = lHist
+		lHist[iBucket] += 1
+		lHist[-2] += fValue
+		lHist[-1] += 1
+
+def _metricHost(sHost):
+	"""Get the metric label for a host.  Only the hosts of g_lCatRoots and
+	local files get their own label, everything else is 'other', since
+	requests can name any URL and each label value is kept forever.
+	"""
+	if sHost == 'local': return sHost
+	for sRoot in g_lCatRoots:
+		if _urlHost(_rewriteUrl(sRoot)) == sHost: return sHost
+	return 'other'
+
+def _fmtLabels(tLabels):
+	if len(tLabels) == 0: return ""
+	lOut = []
+	for (sLabel, sVal) in tLabels:
+		sVal = ("%s"%sVal).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+		lOut.append('%s="%s"'%(sLabel, sVal))
+	return "{%s}"%",".join(lOut)
+
+def metricsText():
+	"""Get this process's metrics in the Prometheus text exposition format
+
+	Returns:
+		(sText, sContentType)
+	"""
+	with g_metricLock:
+		lItems = [(k, list(v) if isinstance(v, list) else v) for (k, v) in g_dMetrics.items()]
+
+	dByName = {}
+	for ((sName, tLabels), value) in lItems:
+		dByName.setdefault(sName, []).append( (tLabels, value) )
+
+	lOut = []
+	for sName in sorted(g_dMetricInfo):
+		(sType, sHelp) = g_dMetricInfo[sName]
+		lOut.append("# HELP %s %s"%(sName, sHelp))
+		lOut.append("# TYPE %s %s"%(sName, sType))
+
+		for (tLabels, value) in sorted(dByName.get(sName, []), key=lambda t: t[0]):
+			if sType != 'histogram':
+				lOut.append("%s%s %s"%(sName, _fmtLabels(tLabels), value))
+				continue
+
+			nCum = 0
+			for (iBucket, fLe) in enumerate(g_tTimeBuckets + (float('inf'),)):
+				nCum += value[iBucket]
+				sLe = "+Inf" if iBucket == len(g_tTimeBuckets) else repr(fLe)
+				lOut.append("%s_bucket%s %d"%(
+				            sName, _fmtLabels(tLabels + (('le', sLe),)), nCum))
+			lOut.append("%s_sum%s %r"%(sName, _fmtLabels(tLabels), value[-2]))
+			lOut.append("%s_count%s %d"%(sName, _fmtLabels(tLabels), value[-1]))
+
+	# Values kept elsewhere, read at scrape time
+	lOut.append("# HELP das2cat_node_cache_entries Parsed nodes held in memory")
+	lOut.append("# TYPE das2cat_node_cache_entries gauge")
+	lOut.append("das2cat_node_cache_entries %d"%len(g_dNodeLru))
+	lOut.append("# HELP das2cat_page_cache_entries Rendered pages held in memory")
+	lOut.append("# TYPE das2cat_page_cache_entries gauge")
+	lOut.append("das2cat_page_cache_entries %d"%len(g_dPageLru))
+
+	dHttp = httpStats()
+	lOut.append("# HELP das2cat_http_requests_total Upstream HTTP requests sent over pooled connections")
+	lOut.append("# TYPE das2cat_http_requests_total counter")
+	lOut.append("das2cat_http_requests_total %d"%dHttp['requests'])
+	lOut.append("# HELP das2cat_http_connections_total Upstream HTTP connections opened")
+	lOut.append("# TYPE das2cat_http_connections_total counter")
+	lOut.append("das2cat_http_connections_total %d"%dHttp['connections'])
+
+	return ("%s\n"%"\n".join(lOut), "text/plain; version=0.0.4; charset=utf-8")
+
+def _acceptedEncoding(sAccept):
+	"""Pick gzip or deflate from an Accept-Encoding header value
+
+	Returns:
+		'gzip', 'deflate' or None if neither is acceptable
+	"""
+	if not sAccept: return None
+
+	dQuality = {}
+	for sItem in sAccept.split(','):
+		lParts = [s.strip() for s in sItem.split(';')]
+		fQ = 1.0
+		for sParam in lParts[1:]:
+			if sParam.lower().startswith('q='):
+				try:
+					fQ = float(sParam[2:])
+				except ValueError:
+					fQ = 0.0
+		dQuality[lParts[0].lower()] = fQ
+
+	sBest = None
+	fBest = 0.0
+	for sCoding in ('gzip', 'deflate'):
+		fQ = dQuality.get(sCoding, dQuality.get('*', 0.0))
+		if fQ > fBest:
+			(sBest, fBest) = (sCoding, fQ)
+	return sBest
+
+def encodeResponse(lOut, sAcceptEnc, sType="text/html; charset=utf-8"):
+	"""Turn collected page output into a single response body.
+
+	The body is compressed if the client accepts gzip or deflate and it is
+	long enough to be worth the trouble.
+
+	Args:
+		lOut: The output list given to beginRequest()
+		sAcceptEnc: The value of the Accept-Encoding request header, if any
+		sType: The Content-Type of the response
+
+	Returns:
+		(yBody, lHeaders) - The encoded body and a list of (name, value)
+		response header tuples, including Content-Length.
+	"""
+	yBody = ''.join(lOut).encode('utf-8')
+	lHeaders = [('Content-Type', sType), ('Vary', 'Accept-Encoding')]
+
+	sCoding = None
+	if len(yBody) >= g_nCompressMin:
+		sCoding = _acceptedEncoding(sAcceptEnc)
+
+	if sCoding == 'gzip':
+		yBody = gzip.compress(yBody, compresslevel=g_nCompressLevel, mtime=0)
+	elif sCoding == 'deflate':
+		yBody = zlib.compress(yBody, g_nCompressLevel)
+
+	if sCoding:
+		lHeaders.append( ('Content-Encoding', sCoding) )
+	lHeaders.append( ('Content-Length', str(len(yBody))) )
+
+	return (yBody, lHeaders)
+
+def _getenv(sKey):
+	dEnviron = getattr(g_req, 'environ', None)
+	if dEnviron != None:
+		return dEnviron.get(sKey)
+	return os.getenv(sKey)
+
+
 #############################################################################
 g_sScriptUrl = None
 
 def scriptUrl():
 	global g_sScriptUrl
 
-	if g_sScriptUrl:
+	bReq = hasattr(g_req, 'environ')
+	if bReq and g_req.sScriptUrl:
+		return g_req.sScriptUrl
+	if (not bReq) and g_sScriptUrl:
 		return g_sScriptUrl
 
 	sProto = 'http://'
 	sPort = ''
 
-	if os.getenv('HTTPS') != None:
-		if os.getenv('HTTPS').lower() in ['1','on']:
+	if _getenv('HTTPS') != None:
+		if _getenv('HTTPS').lower() in ['1','on']:
 			sProto = 'https://'
 
-	if os.getenv('SERVER_PORT'):
-		nPort = int(os.getenv('SERVER_PORT'))
+	if _getenv('SERVER_PORT'):
+		nPort = int(_getenv('SERVER_PORT'))
 	else:
 
 		nPort = 80
@@ -110,9 +664,11 @@ def scriptUrl():
 	if (sProto == 'http://' and nPort != 80) or (sProto == 'https//' and nPort != 443):
 		sPort = ':%d' % nPort
 
-	g_sScriptUrl = "%s%s%s%s"%(sProto, os.getenv('SERVER_NAME'), sPort,
-	                           os.getenv('SCRIPT_NAME'))
-	return g_sScriptUrl
+	sUrl = "%s%s%s%s"%(sProto, _getenv('SERVER_NAME'), sPort,
+	                   _getenv('SCRIPT_NAME'))
+	if bReq: g_req.sScriptUrl = sUrl
+	else:    g_sScriptUrl = sUrl
+	return sUrl
 
 #############################################################################
 def _isTrue(d, key):
@@ -158,26 +714,1227 @@ def pathInfoToCatId(sPathInfo):
 
 
 #############################################################################
-# Get Node definition and path information by Id
+# Node fetching with an on-disk cache
 
-def _getNode(lAttempted, lPathTo, sUrl, sPath, sWanted):
-	
-	if sUrl not in lAttempted:
-		lAttempted.append(sUrl)
-	else:
-		# We have a loop, break it here
-		pout("Loop detected in catalog, at %s, needs to be fixed<br><br>"%sUrl)
+# Cache directories already checked by _cacheDir(), by path
+g_dCacheDirOk = {}
+
+def _cacheDir():
+	"""Get g_sCacheDir, creating it if needed
+
+	Returns:
+		The directory, or None if caching is off or the directory can't be
+		trusted: it must be a real directory owned by this user that only
+		this user can write to.  Otherwise anyone else on the host could
+		plant nodes or pages.
+	"""
+	sDir = g_sCacheDir
+	if not sDir: return None
+
+	bOk = g_dCacheDirOk.get(sDir)
+	if bOk == None:
+		bOk = _privateDir(sDir)
+		if not bOk:
+			perr("WARNING: Not caching, %s isn't a private directory of this user"%sDir)
+		g_dCacheDirOk[sDir] = bOk
+
+	return sDir if bOk else None
+
+def _privateDir(sDir):
+	try:
+		os.makedirs(sDir, mode=0o700, exist_ok=True)
+		st = os.lstat(sDir)
+	except OSError:
+		return False
+
+	if not stat.S_ISDIR(st.st_mode): return False
+	if hasattr(os, 'geteuid') and (st.st_uid != os.geteuid()): return False
+	return (st.st_mode & 0o022) == 0
+
+def _trustedFile(sFile, st):
+	"""Index files send lookups to the URLs they list, so only use ones that
+	belong to this user or root, or that sit in a directory others can't
+	write to.  st is the file's os.stat() result.
+	"""
+	if not hasattr(os, 'geteuid'): return True
+	if st.st_mode & 0o002: return False
+	if st.st_uid in (os.geteuid(), 0): return True
+	try:
+		stDir = os.stat(os.path.dirname(os.path.abspath(sFile)))
+	except OSError:
+		return False
+	return (stDir.st_mode & 0o022) == 0
+
+def _cachePaths(sUrl):
+	"""Get the body and header file names used to cache a URL"""
+	sHash = hashlib.sha1(sUrl.encode('utf-8')).hexdigest()
+	sBase = os.path.join(g_sCacheDir, sHash[:2], sHash)
+	return ("%s.json"%sBase, "%s.head"%sBase)
+
+def _cacheHead(sUrl):
+	"""Read just the header record for a cached URL, or None"""
+	if not _cacheDir(): return None
+
+	(sBodyFile, sHeadFile) = _cachePaths(sUrl)
+	try:
+		with open(sHeadFile, 'r', encoding='utf-8') as f:
+			dHead = json.load(f)
+	except (OSError, ValueError):
 		return None
 
+	if dHead.get('url') != sUrl: return None
+	return dHead
+
+def _cacheLoad(sUrl):
+	"""Read a cached node body and the header record stored with it.
+
+	Returns:
+		(sBody, dHead) or (None, None) if the URL is not in the cache
+	"""
+	dHead = _cacheHead(sUrl)
+	if dHead == None: return (None, None)
+
+	(sBodyFile, sHeadFile) = _cachePaths(sUrl)
+	try:
+		with open(sBodyFile, 'r', encoding='utf-8') as f:
+			sBody = f.read()
+	except OSError:
+		return (None, None)
+
+	return (sBody, dHead)
+
+def _cacheWrite(sFile, sText):
+	# Write to the side and then move into place so that readers never see
+	# a partial file.  Each writer gets it's own temporary file, threads of
+	# the same process may be writing the same target.
+	(nFd, sTmp) = tempfile.mkstemp(
+		dir=os.path.dirname(sFile), prefix=os.path.basename(sFile) + '.',
+		suffix='.tmp'
+	)
+	try:
+		with os.fdopen(nFd, 'w', encoding='utf-8') as f:
+			f.write(sText)
+		os.replace(sTmp, sFile)
+	except BaseException:
+		try:
+			os.unlink(sTmp)
+		except OSError:
+			pass
+		raise
+
+def _cacheStore(sUrl, sBody, dHead):
+	"""Save a node body and header record to the cache.  If sBody is None
+	only the header record is updated.
+	"""
+	if not _cacheDir(): return
+
+	(sBodyFile, sHeadFile) = _cachePaths(sUrl)
+	try:
+		os.makedirs(os.path.dirname(sBodyFile), exist_ok=True)
+		if sBody != None:
+			_cacheWrite(sBodyFile, sBody)
+		_cacheWrite(sHeadFile, json.dumps(dHead))
+	except OSError:
+		pass   # An unwritable cache just means we're slower
+
+def _parseNode(sBody):
+	fBeg = time.perf_counter()
 	try:
-		res = requests.get(sUrl)
-		if res.status_code != requests.codes.ok:
+		dNode = json.loads(sBody)
+	except ValueError:
+		return None
+	finally:
+		_addTime('parse', time.perf_counter() - fBeg)
+		_count('das2cat_nodes_parsed_total')
+	if not isinstance(dNode, dict): return None
+	return dNode
+
+
+# One HTTP session for the process so that consecutive catalog hops to the
+# same host reuse a connection instead of paying for a TCP/TLS setup
+g_session = None
+g_sessionLock = threading.Lock()
+
+def _httpSession():
+	global g_session
+
+	with g_sessionLock:
+		if g_session == None:
+			# Only 502-504 replies are retried.  Connect and read errors
+			# (including timeouts) aren't, a hung or blackholed host would
+			# cost twice the timeout before the host health saw it fail.
+			retry = urllib3.util.Retry(
+				total=g_nRetries, connect=0, read=0, backoff_factor=0.1,
+				raise_on_status=False, status_forcelist=(502, 503, 504)
+			)
+			# The pool itself doesn't block, requests has no way to bound
+			# the wait for a connection.  The limit is _takeSlot() instead.
+			adapter = requests.adapters.HTTPAdapter(
+				pool_connections=g_nPoolHosts, pool_maxsize=g_nPoolSize,
+				max_retries=retry
+			)
+			session = requests.Session()
+			session.mount('http://', adapter)
+			session.mount('https://', adapter)
+			g_session = session
+
+	return g_session
+
+# Requests in flight to each host, host -> [semaphore, threads using it].
+# Idle hosts past the g_nPoolHosts most recent are forgotten.
+g_dHostSlots = collections.OrderedDict()
+g_slotLock = threading.Lock()
+
+def _takeSlot(sHost, fTimeout):
+	"""Wait for one of the g_nPoolSize request slots for a host
+
+	Args:
+		sHost: The host
+		fTimeout: Max seconds to wait, None to wait forever
+
+	Returns:
+		The slot to hand to _giveSlot() when the request is done, or None
+		if none came free in time
+	"""
+	with g_slotLock:
+		lSlot = g_dHostSlots.get(sHost)
+		if lSlot == None:
+			lSlot = [threading.BoundedSemaphore(g_nPoolSize), 0]
+			g_dHostSlots[sHost] = lSlot
+		g_dHostSlots.move_to_end(sHost)
+		lSlot[1] += 1
+
+		nOver = len(g_dHostSlots) - g_nPoolHosts
+		if nOver > 0:
+			for sIdle in [s for s in g_dHostSlots if g_dHostSlots[s][1] == 0][:nOver]:
+				del g_dHostSlots[sIdle]
+
+	if lSlot[0].acquire(timeout=fTimeout): return lSlot
+
+	with g_slotLock:
+		lSlot[1] -= 1
+	return None
+
+def _giveSlot(lSlot):
+	lSlot[0].release()
+	with g_slotLock:
+		lSlot[1] -= 1
+
+def _httpGet(sUrl, dHeaders, fTimeout=None):
+	"""GET a URL, streaming in the body up to g_nMaxNodeBytes
+
+	Args:
+		sUrl: The URL to read
+		dHeaders: Extra request headers
+		fTimeout: Give up if connecting, any single read, or the whole body
+			takes longer than this many seconds, counting any wait for a free
+			connection to the host.  None to wait forever.
+
+	Returns:
+		(res, yBody) - The response and it's body.  yBody is None if the
+		body was larger than g_nMaxNodeBytes, the rest of it isn't read.
+	"""
+	fBeg = time.time()
+	if g_nPoolSize < 1:
+		res = requests.get(sUrl, headers=dHeaders, stream=True, timeout=fTimeout)
+		return _httpBody(res, fBeg, fTimeout)
+
+	lSlot = _takeSlot(_urlHost(sUrl), fTimeout)
+	if lSlot == None:
+		raise requests.exceptions.Timeout(
+			"No free connection to %s within %.1f seconds"%(_urlHost(sUrl), fTimeout)
+		)
+	try:
+		fLeft = fTimeout
+		if fTimeout != None:
+			fLeft = max(fTimeout - (time.time() - fBeg), 0.001)
+		res = _httpSession().get(
+			sUrl, headers=dHeaders, stream=True, timeout=fLeft
+		)
+		return _httpBody(res, fBeg, fTimeout)
+	finally:
+		_giveSlot(lSlot)
+
+def _httpBody(res, fBeg, fTimeout):
+	"""Read a streamed response body for _httpGet() and close it"""
+	# Closing a fully read response puts the connection back in the pool,
+	# closing part way through drops it
+	try:
+		sLen = res.headers.get('Content-Length', '')
+		if sLen.isdigit() and (int(sLen) > g_nMaxNodeBytes):
+			return (res, None)
+
+		lChunks = []
+		nBytes = 0
+		for yChunk in res.iter_content(65536):
+			nBytes += len(yChunk)
+			if nBytes > g_nMaxNodeBytes:
+				return (res, None)
+			if (fTimeout != None) and (time.time() - fBeg > fTimeout):
+				raise requests.exceptions.Timeout(
+					"Reply took longer than %.1f seconds"%fTimeout
+				)
+			lChunks.append(yChunk)
+
+		return (res, b''.join(lChunks))
+	finally:
+		res.close()
+
+def httpStats():
+	"""Get connection reuse counts for upstream requests made by this process
+
+	Returns:
+		A dictionary with the keys 'requests', the number of HTTP requests
+		sent, 'connections', the number of connections opened to send them,
+		and 'reuse', the fraction of requests that went over a connection
+		that was already open.
+	"""
+	dStats = {'requests':0, 'connections':0, 'reuse':0.0}
+	if g_session == None: return dStats
+
+	for adapter in set(g_session.adapters.values()):
+		pools = adapter.poolmanager.pools
+		for key in pools.keys():
+			pool = pools.get(key)
+			if pool == None: continue
+			dStats['requests'] += pool.num_requests
+			dStats['connections'] += pool.num_connections
+
+	if dStats['requests'] > 0:
+		dStats['reuse'] = 1.0 - dStats['connections'] / dStats['requests']
+	return dStats
+
+
+# Upstream host health, kept in the cache directory as well so that short
+# lived CGI processes learn from each other.  For each host:
+#
+#    score  - Smoothed response time with failures counted as
+#             g_fFailPenalty seconds, for ranking mirrors
+#    srtt   - Smoothed time taken by good replies, for timeouts
+#    rttvar - Smoothed deviation of good reply times from srtt
+#    fails  - Number of failures in a row
+#    open   - Time until which the host is skipped, see g_nBreakerFails
+#    used   - When the host was last heard from, see g_nHostsMax
+#
+# Recently failed URLs are kept in g_dFailedUrls as [retry time, error].
+g_dHosts = None
+g_dFailedUrls = None
+g_hostLock = threading.Lock()
+
+# When host health was last written and whether it's changed since
+g_fHostsSaved = 0.0
+g_bHostsDirty = False
+g_hostSaveLock = threading.Lock()
+g_bHostsAtExit = False
+
+def _urlHost(sUrl):
+	return urllib.parse.urlsplit(sUrl).netloc.lower()
+
+def _loadHosts():
+	"""Read host health from the cache directory, call with g_hostLock held"""
+	global g_dHosts, g_dFailedUrls, g_fHostsSaved, g_bHostsDirty, g_bHostsAtExit
+
+	g_dHosts = {}
+	g_dFailedUrls = {}
+	g_fHostsSaved = time.time()
+	g_bHostsDirty = False
+	if not g_bHostsAtExit:
+		atexit.register(_saveHosts, True)
+		g_bHostsAtExit = True
+
+	if not _cacheDir(): return
+	try:
+		with open(os.path.join(g_sCacheDir, 'hosts.json'), 'r') as f:
+			dSaved = json.load(f)
+	except (OSError, ValueError):
+		return
+
+	# Older files only have the score for each host
+	if 'hosts' not in dSaved:
+		dSaved = {'hosts':dict((sHost, {'score':fScore}) for (sHost, fScore) in dSaved.items())}
+
+	g_dHosts = dSaved.get('hosts', {})
+	fNow = time.time()
+	for (sUrl, lFail) in dSaved.get('failed', {}).items():
+		if lFail[0] > fNow: g_dFailedUrls[sUrl] = lFail
+	_pruneHosts()
+
+def _pruneHosts():
+	"""Keep the host table and negative cache within g_nHostsMax and
+	g_nFailedMax entries, call with g_hostLock held
+	"""
+	# Trim 10% below the limit so this doesn't run on every update
+	if len(g_dHosts) > g_nHostsMax:
+		lOld = sorted(g_dHosts, key=lambda sHost: g_dHosts[sHost].get('used', 0))
+		for sHost in lOld[:len(g_dHosts) - int(g_nHostsMax*0.9)]:
+			del g_dHosts[sHost]
+		_noteHostsChanged()
+
+	if len(g_dFailedUrls) > g_nFailedMax:
+		fNow = time.time()
+		for sUrl in [s for s in g_dFailedUrls if g_dFailedUrls[s][0] <= fNow]:
+			del g_dFailedUrls[sUrl]
+		nOver = len(g_dFailedUrls) - int(g_nFailedMax*0.9)
+		if nOver > 0:
+			lOld = sorted(g_dFailedUrls, key=lambda sUrl: g_dFailedUrls[sUrl][0])
+			for sUrl in lOld[:nOver]:
+				del g_dFailedUrls[sUrl]
+		_noteHostsChanged()
+
+def _noteHostsChanged():
+	global g_bHostsDirty
+	g_bHostsDirty = True
+
+def _saveHosts(bNow=False):
+	"""Write out host health if it's changed, call without g_hostLock held.
+	Unless bNow is set this is skipped if it was done in the last
+	g_fHostSaveDelay seconds, or another thread is already at it.
+	"""
+	global g_fHostsSaved, g_bHostsDirty
+
+	if (not g_bHostsDirty) or (not _cacheDir()): return
+	if (not bNow) and (time.time() - g_fHostsSaved < g_fHostSaveDelay): return
+	if not g_hostSaveLock.acquire(blocking=bNow): return
+
+	try:
+		with g_hostLock:
+			if (g_dHosts == None) or (not g_bHostsDirty): return
+			fNow = time.time()
+			for sUrl in [s for s in g_dFailedUrls if g_dFailedUrls[s][0] <= fNow]:
+				del g_dFailedUrls[sUrl]
+
+			sOut = json.dumps({'hosts':g_dHosts, 'failed':g_dFailedUrls})
+			g_fHostsSaved = fNow
+			g_bHostsDirty = False
+
+		try:
+			_cacheWrite(os.path.join(g_sCacheDir, 'hosts.json'), sOut)
+		except OSError:
+			pass
+	finally:
+		g_hostSaveLock.release()
+
+def _hostTimeout(sUrl):
+	"""How long to wait for a reply from the host of sUrl"""
+	with g_hostLock:
+		if g_dHosts == None: _loadHosts()
+		dHost = g_dHosts.get(_urlHost(sUrl), {})
+		if 'srtt' not in dHost: return g_fTimeoutMax
+		fTimeout = dHost['srtt'] + 4*dHost['rttvar'] + g_fTimeoutMargin
+
+	return min(max(fTimeout, g_fTimeoutMin), g_fTimeoutMax)
+
+def _skipReason(sUrl, sSrcUrl):
+	"""Check the negative cache and the host's circuit breaker
+
+	Returns:
+		None if sSrcUrl may be requested, or the reason it shouldn't be
+	"""
+	fNow = time.time()
+	with g_hostLock:
+		if g_dHosts == None: _loadHosts()
+
+		lFail = g_dFailedUrls.get(sUrl)
+		if (lFail != None) and (lFail[0] > fNow):
+			return "Failed %.0f seconds ago, %s"%(
+				g_nNegativeTTL - (lFail[0] - fNow), lFail[1]
+			)
+
+		dHost = g_dHosts.get(_urlHost(sSrcUrl))
+		if (dHost == None) or (not dHost.get('open')): return None
+		if dHost['open'] > fNow:
+			return "Host %s is down, retrying in %.0f seconds"%(
+				_urlHost(sSrcUrl), dHost['open'] - fNow
+			)
+
+		# Half open, let this request test the host and hold off the others
+		# until it's done
+		dHost['open'] = fNow + g_fTimeoutMax
+		_noteHostsChanged()
+
+	# Other processes have to hold off as well
+	_saveHosts(True)
+	return None
+
+def _noteUrlFailure(sUrl, sError):
+	"""Put a URL in the negative cache"""
+	if g_nNegativeTTL <= 0: return
+	with g_hostLock:
+		if g_dHosts == None: _loadHosts()
+		g_dFailedUrls[sUrl] = [time.time() + g_nNegativeTTL, sError]
+		_noteHostsChanged()
+		_pruneHosts()
+	_saveHosts()
+
+def _noteLatency(sUrl, fSec):
+	"""Fold a response time into a host's health, use None for failures"""
+	sHost = _urlHost(sUrl)
+	bOpened = False
+	bClosed = False
+
+	with g_hostLock:
+		if g_dHosts == None: _loadHosts()
+		dHost = g_dHosts.setdefault(sHost, {})
+		dHost['used'] = round(time.time())
+
+		fScore = g_fFailPenalty if fSec == None else fSec
+		if 'score' in dHost: dHost['score'] += 0.3*(fScore - dHost['score'])
+		else:                dHost['score'] = fScore
+
+		if fSec != None:
+			# Same smoothing as TCP retransmit timers, RFC 6298
+			if 'srtt' in dHost:
+				dHost['rttvar'] += 0.25*(abs(dHost['srtt'] - fSec) - dHost['rttvar'])
+				dHost['srtt'] += 0.125*(fSec - dHost['srtt'])
+			else:
+				(dHost['srtt'], dHost['rttvar']) = (fSec, fSec/2)
+			dHost['fails'] = 0
+			bClosed = bool(dHost.get('open'))
+			dHost['open'] = 0
+		else:
+			dHost['fails'] = dHost.get('fails', 0) + 1
+			nOver = dHost['fails'] - g_nBreakerFails
+			if nOver >= 0:
+				fDelay = min(g_fBreakerDelay*(2**min(nOver, 30)), g_fBreakerMaxDelay)
+				dHost['open'] = time.time() + fDelay
+				bOpened = True
+		_noteHostsChanged()
+		_pruneHosts()
+
+	# Breaker changes are shared with other processes right away
+	_saveHosts(bOpened or bClosed)
+
+	if bOpened:
+		_count('das2cat_breaker_opened_total', (('host', _metricHost(sHost)),))
+		perr("WARNING: %d failures in a row from %s, skipping it for %.0f seconds"%(
+		     dHost['fails'], sHost, fDelay))
+
+def _rankMirrors(lUrls):
+	"""Sort mirror URLs fastest first.  URLs that are rewritten to local files
+	always go first.  Hosts we haven't heard from yet go next so that they get
+	measured, otherwise catalog order is kept.  Hosts that are being skipped
+	(see g_nBreakerFails) go last.
+	"""
+	if len(lUrls) < 2: return list(lUrls)
+
+	with g_hostLock:
+		if g_dHosts == None: _loadHosts()
+		fNow = time.time()
+		dRank = dict(
+			(sHost, (dHost.get('open', 0) > fNow, dHost.get('score', 0.0)))
+			for (sHost, dHost) in g_dHosts.items()
+		)
+
+	# Hosts that are down go last
+	def rank(sUrl):
+		sSrcUrl = _rewriteUrl(sUrl)
+		if sSrcUrl.lower().startswith('file:'): return (False, -1.0)
+		return dRank.get(_urlHost(sSrcUrl), (False, 0.0))
+
+	return sorted(lUrls, key=rank)
+
+
+# In-memory LRU of parsed nodes, in front of the disk cache.  Entries are
+# (node, dHead) tuples, nodes are stored in compact form, see compactNode().
+# Cached nodes are shared between requests, so only shallow dict copies are
+# handed out; don't modify sub-objects in place.
+g_dNodeLru = collections.OrderedDict()
+g_lruLock = threading.Lock()
+
+def _lruGet(sUrl):
+	if g_nNodeCacheSize < 1: return None
+
+	with g_lruLock:
+		tEnt = g_dNodeLru.get(sUrl)
+		if tEnt != None:
+			g_dNodeLru.move_to_end(sUrl)
+	return tEnt
+
+def _lruPut(sUrl, dNode, dHead):
+	if g_nNodeCacheSize < 1: return
+
+	if not isinstance(dNode, Node): dNode = compactNode(dNode)
+	with g_lruLock:
+		g_dNodeLru[sUrl] = (dNode, dHead)
+		g_dNodeLru.move_to_end(sUrl)
+		while len(g_dNodeLru) > g_nNodeCacheSize:
+			g_dNodeLru.popitem(last=False)
+
+def _rewriteUrl(sUrl):
+	"""Apply the first matching g_lUrlRewrites rule to a URL"""
+	for (sFrom, sTo) in g_lUrlRewrites:
+		if not sUrl.startswith(sFrom): continue
+
+		if '://' not in sTo:
+			sDir = os.path.abspath(sTo)
+			if sTo.endswith('/'): sDir += '/'
+			sTo = "file://%s"%urllib.request.pathname2url(sDir)
+		return sTo + sUrl[len(sFrom):]
+
+	return sUrl
+
+def _localPath(sFileUrl):
+	"""Get the local file for a file:// URL, or None if it's not allowed"""
+	sFile = os.path.realpath(
+		urllib.request.url2pathname(urllib.parse.urlsplit(sFileUrl).path)
+	)
+
+	lDirs = list(g_lLocalDirs)
+	for (sFrom, sTo) in g_lUrlRewrites:
+		if '://' not in sTo:
+			lDirs.append(sTo)
+		elif sTo.lower().startswith('file:'):
+			lDirs.append(urllib.request.url2pathname(urllib.parse.urlsplit(sTo).path))
+
+	for sDir in lDirs:
+		sDir = os.path.realpath(sDir)
+		if os.path.commonpath([sFile, sDir]) == sDir:
+			return sFile
+	return None
+
+def _fetchLocal(sUrl, sFileUrl, dInfo):
+	"""Read a node from a local file, the in-memory cache is used if the
+	file hasn't changed.  See _fetchNode for the arguments.
+	"""
+	sFile = _localPath(sFileUrl)
+	if sFile == None:
+		dInfo['cache'] = 'failed'
+		dInfo['error'] = "Reading %s is not allowed, see g_lLocalDirs"%sFileUrl
+		return None
+
+	try:
+		st = os.stat(sFile)
+		nMtime = st.st_mtime
+		if st.st_size > g_nMaxNodeBytes:
+			dInfo['cache'] = 'failed'
+			dInfo['error'] = "Node is larger than %d bytes"%g_nMaxNodeBytes
 			return None
-		dNode = json.loads(res.text)
+
+		tEnt = _lruGet(sUrl)
+		if (tEnt != None) and (tEnt[1].get('mtime') == nMtime):
+			dInfo['cache'] = 'hit'
+			return dict(tEnt[0])
+
+		with open(sFile, 'r', encoding='utf-8') as f:
+			sBody = f.read()
+	except OSError as e:
+		dInfo['cache'] = 'failed'
+		dInfo['error'] = str(e)
+		return None
+
+	dInfo['bytes'] = len(sBody)
+	dNode = _parseNode(sBody)
+	if dNode == None:
+		dInfo['cache'] = 'failed'
+		dInfo['error'] = "Not a JSON object"
+		return None
+
+	_lruPut(sUrl, dNode, {'url':sUrl, 'stored':time.time(), 'mtime':nMtime})
+	dInfo['cache'] = 'fetched'
+	return dict(dNode)
+
+def _navNode(dNode):
+	"""Get the parts of a node needed to walk through it to a sub-node"""
+	dNav = dict((sKey, dNode[sKey]) for sKey in g_tNavKeys if sKey in dNode)
+	for sList in ('catalog', 'sources'):
+		if not isinstance(dNode.get(sList), dict): continue
+		dNav[sList] = {}
+		for sKey in dNode[sList]:
+			dEnt = dNode[sList][sKey]
+			if isinstance(dEnt, dict) and ('urls' in dEnt):
+				# An entry may give it's node's separator, see _childSep()
+				dNav[sList][sKey] = dict(
+					(sEntKey, dEnt[sEntKey]) for sEntKey in ('urls', 'separator')
+					if sEntKey in dEnt
+				)
+	dNav['_nav'] = True
+	return dNav
+
+def _fetchNode(sUrl, dInfo=None, bNav=False):
+	"""Get a catalog node by URL, using the node caches when possible.
+
+	The URL is first passed through g_lUrlRewrites, local files are read
+	directly.  Otherwise nodes are looked for in memory first (long running
+	processes only) and then on disk.  Entries younger than g_nCacheTTL are returned without
+	contacting the server.  Older entries are revalidated with If-None-Match
+	and/or If-Modified-Since so that unchanged nodes only cost a 304 reply.
+	If the server can't be reached, or is having problems, a stale copy is
+	better than nothing and is returned instead.
+
+	Args:
+		sUrl: The URL of the JSON node to read
+
+		dInfo: If not None, details of how the node was obtained are added
+			here.  'cache' is one of 'hit', 'revalidated', 'stale', 'fetched'
+			or 'failed', 'status' is the HTTP status code (if a request was
+			made), 'bytes' the size of a downloaded body and 'error' the
+			reason for a failure.  'skipped' is set if no request was made
+			because the URL failed recently or it's host is down.
+
+		bNav: If True, the caller is only passing through this node on the
+			way to another one.  A navigation summary (see g_tNavKeys) with
+			the key '_nav' set may be returned instead of the full node,
+			which saves reading and parsing the whole node from the disk
+			cache.
+
+	Returns:
+		A node dictionary that the caller may add top-level keys to, or None
+		if the node could not be read
+	"""
+	if dInfo == None: dInfo = {}
+
+	# Requests that resolve many paths read each node once, see resolveMany()
+	dShared = getattr(g_req, 'dShared', None)
+	if dShared != None:
+		return _sharedFetch(dShared, sUrl, dInfo, bNav)
+
+	return _timedFetch(sUrl, dInfo, bNav)
+
+def _timedFetch(sUrl, dInfo, bNav):
+	fBeg = time.perf_counter()
+	dNode = _readNode(sUrl, dInfo, bNav)
+	_noteFetch(sUrl, dInfo, time.perf_counter() - fBeg)
+
+	if ('http' in dInfo) and ('error' in dInfo) and (not dInfo.get('late')):
+		_noteUrlFailure(sUrl, dInfo['error'])
+	return dNode
+
+g_shareFetchLock = threading.Lock()
+
+def _sharedFetch(dShared, sUrl, dInfo, bNav):
+	"""Read a node for the current request only once, no matter how many
+	threads ask for it.  Later callers wait for the first one and get a copy
+	of it's result, with 'shared' set in dInfo.
+	"""
+	with g_shareFetchLock:
+		# A full node will do for navigation too
+		lEnt = dShared.get((sUrl, False))
+		if (lEnt == None) and bNav: lEnt = dShared.get((sUrl, True))
+		bFirst = (lEnt == None)
+		if bFirst:
+			lEnt = [threading.Event(), None, {}]
+			dShared[(sUrl, bNav)] = lEnt
+
+	if bFirst:
+		try:
+			lEnt[1] = _timedFetch(sUrl, lEnt[2], bNav)
+		finally:
+			lEnt[0].set()
+	else:
+		lEnt[0].wait()
+		dInfo['shared'] = True
+
+	dInfo.update(lEnt[2])
+	if lEnt[1] == None: return None
+	return dict(lEnt[1])
+
+def _readNode(sUrl, dInfo, bNav):
+	"""The body of _fetchNode(), which adds timing"""
+	sSrcUrl = _rewriteUrl(sUrl)
+	if sSrcUrl.lower().startswith('file:'):
+		return _fetchLocal(sUrl, sSrcUrl, dInfo)
+
+	# The in-memory cache may hold just the navigation summary
+	dNode = None
+	tEnt = _lruGet(sUrl)
+	if (tEnt != None) and (bNav or not tEnt[0].get('_nav')):
+		(dNode, dHead) = tEnt
+	else:
+		dHead = _cacheHead(sUrl)
+		if (dHead != None) and bNav and ('nav' in dHead):
+			_lruPut(sUrl, dHead['nav'], dHead)
+		elif dHead != None:
+			(sBody, dHead) = _cacheLoad(sUrl)
+			if sBody != None:
+				dNode = _parseNode(sBody)
+				if dNode != None:
+					if 'nav' not in dHead: dHead['nav'] = _navNode(dNode)
+					_lruPut(sUrl, dNode, dHead)
+
+	# What we have on hand, if anything
+	def cached():
+		if dNode != None: return dict(dNode)
+		return dict(dHead['nav'])
+
+	bCached = (dNode != None) or \
+	          (bNav and (dHead != None) and ('nav' in dHead))
+
+	if bCached and (time.time() - dHead['stored'] < g_nCacheTTL):
+		dInfo['cache'] = 'hit'
+		return cached()
+
+	# Don't wait past the page deadline, or on URLs that just failed or hosts
+	# that are down
+	fTimeout = _hostTimeout(sSrcUrl)
+	fLeft = _timeLeft()
+	bDeadline = (fLeft != None) and (fLeft < fTimeout)
+	if bDeadline and (fLeft < g_fTimeoutMin/10):
+		sSkip = "Out of time for this page"
+		dInfo['late'] = True
+		_noteLate(sUrl)
+	else:
+		sSkip = _skipReason(sUrl, sSrcUrl)
+
+	if sSkip != None:
+		_count('das2cat_fetches_skipped_total',
+		       (('host', _metricHost(_urlHost(sSrcUrl))),))
+		dInfo['error'] = sSkip
+		dInfo['skipped'] = True
+		if bCached:
+			dInfo['cache'] = 'stale'
+			return cached()
+		dInfo['cache'] = 'failed'
+		return None
+
+	dReqHdrs = {}
+	if bCached:
+		if dHead.get('etag'): dReqHdrs['If-None-Match'] = dHead['etag']
+		if dHead.get('modified'): dReqHdrs['If-Modified-Since'] = dHead['modified']
+
+	if bDeadline: fTimeout = fLeft
+
+	fBeg = time.time()
+	try:
+		(res, yBody) = _httpGet(sSrcUrl, dReqHdrs, fTimeout)
 	except Exception as e:
 		#pout("Failed to get %s, reason: %s<br><br>\n"%(sUrl, str(e)))
+
+		# Running out of page time isn't the host's fault
+		if bDeadline and (_timeLeft() < g_fTimeoutMin/10):
+			dInfo['late'] = True
+			_noteLate(sUrl)
+		else:
+			_noteLatency(sSrcUrl, None)
+		dInfo['http'] = time.time() - fBeg
+		_addTime('fetch', dInfo['http'])
+		dInfo['error'] = str(e)
+		if bCached:
+			dInfo['cache'] = 'stale'
+			return cached()
+		dInfo['cache'] = 'failed'
 		return None
 
+	dInfo['http'] = time.time() - fBeg
+	_addTime('fetch', dInfo['http'])
+	dInfo['status'] = res.status_code
+	dInfo['wait'] = round(res.elapsed.total_seconds(), 6)
+	if res.status_code >= 500: _noteLatency(sSrcUrl, None)
+	else:                      _noteLatency(sSrcUrl, time.time() - fBeg)
+
+	if bCached:
+		if res.status_code == requests.codes.not_modified:
+			dHead = dict(dHead, stored=time.time())
+			_cacheStore(sUrl, None, dHead)
+			if dNode != None: _lruPut(sUrl, dNode, dHead)
+			dInfo['cache'] = 'revalidated'
+			return cached()
+
+		if res.status_code >= 500:
+			dInfo['error'] = "HTTP status %d"%res.status_code
+			dInfo['cache'] = 'stale'
+			return cached()
+
+	dInfo['cache'] = 'failed'
+	if res.status_code != requests.codes.ok:
+		dInfo['error'] = "HTTP status %d"%res.status_code
+		return None
+
+	if yBody == None:
+		dInfo['error'] = "Node is larger than %d bytes"%g_nMaxNodeBytes
+		return None
+
+	dInfo['bytes'] = len(yBody)
+	sBody = yBody.decode('utf-8-sig', errors='replace')
+	dNode = _parseNode(sBody)
+	if dNode == None:
+		dInfo['error'] = "Not a JSON object"
+		return None
+
+	dHead = {
+		'url':sUrl, 'stored':time.time(),
+		'etag':res.headers.get('ETag'), 'modified':res.headers.get('Last-Modified'),
+		'hash':hashlib.sha1(yBody).hexdigest(), 'nav':_navNode(dNode)
+	}
+	_cacheStore(sUrl, sBody, dHead)
+	_lruPut(sUrl, dNode, dHead)
+
+	dInfo['cache'] = 'fetched'
+	return dict(dNode)
+
+def _headVersion(dHead):
+	"""The version tag for a cached node, the ETag if there is one, else a
+	hash of the body, else the Last-Modified time.
+	"""
+	if dHead.get('etag'): return "etag:%s"%dHead['etag']
+	if dHead.get('hash'): return "sha1:%s"%dHead['hash']
+	if dHead.get('modified'): return "modified:%s"%dHead['modified']
+	return None
+
+def nodeVersion(sUrl):
+	"""Get the current version tag of a node.
+
+	Fresh cache entries answer without reading the node itself, stale ones
+	are revalidated with the upstream server first.  Local files are
+	versioned by their modification time.
+
+	Returns:
+		A string that changes whenever the node does, or None if the node
+		can't be read or versioned.
+	"""
+	sSrcUrl = _rewriteUrl(sUrl)
+	if sSrcUrl.lower().startswith('file:'):
+		sFile = urllib.request.url2pathname(urllib.parse.urlsplit(sSrcUrl).path)
+		try:
+			return "mtime:%r"%os.stat(sFile).st_mtime
+		except OSError:
+			return None
+
+	tEnt = _lruGet(sUrl)
+	dHead = tEnt[1] if tEnt != None else _cacheHead(sUrl)
+	if (dHead != None) and (time.time() - dHead['stored'] < g_nCacheTTL):
+		return _headVersion(dHead)
+
+	if _fetchNode(sUrl, None, True) == None: return None
+
+	tEnt = _lruGet(sUrl)
+	dHead = tEnt[1] if tEnt != None else _cacheHead(sUrl)
+	if dHead == None: return None
+	return _headVersion(dHead)
+
+def _noteDep(sUrl):
+	"""Record that the page being rendered uses the node at sUrl"""
+	lDeps = getattr(g_req, 'lDeps', None)
+	if (lDeps != None) and (sUrl not in lDeps):
+		lDeps.append(sUrl)
+
+
+############################################################################
+# Compact node storage for the in-memory cache
+#
+# Long running processes can hold thousands of nodes that repeat the same
+# keys, units strings and even whole sub-objects (a Collection and it's
+# sources usually list the same coordinates).  Nodes put in the LRU are
+# stored as read-only slotted objects, their strings are interned and
+# identical sub-objects are stored once.  The rest of the code never sees
+# these, _fetchNode() hands out dict copies.
+
+class Node(collections.abc.Mapping):
+	"""Read-only catalog node, known top level keys are stored in slots and
+	anything else in a small dictionary.
+	"""
+	__slots__ = ('_extra',)
+	_tFields = ('type', 'name', 'title', 'description', 'version')
+
+	def __init__(self, dNode):
+		dExtra = None
+		for sKey in dNode:
+			if sKey in self._tFields:
+				object.__setattr__(self, sKey, dNode[sKey])
+			else:
+				if dExtra == None: dExtra = {}
+				dExtra[sKey] = dNode[sKey]
+		object.__setattr__(self, '_extra', dExtra)
+
+	def __setattr__(self, sKey, value):
+		raise TypeError("Catalog nodes are read-only")
+
+	def __getitem__(self, sKey):
+		if sKey in self._tFields:
+			try:
+				return object.__getattribute__(self, sKey)
+			except AttributeError:
+				raise KeyError(sKey)
+		if (self._extra != None) and (sKey in self._extra):
+			return self._extra[sKey]
+		raise KeyError(sKey)
+
+	def __iter__(self):
+		for sKey in self._tFields:
+			if hasattr(self, sKey): yield sKey
+		if self._extra != None:
+			for sKey in self._extra: yield sKey
+
+	def __len__(self):
+		return sum(1 for sKey in self)
+
+	def __repr__(self):
+		return "%s(%r)"%(self.__class__.__name__, dict(self))
+
+class Catalog(Node):
+	_tFields = Node._tFields + ('separator', 'catalog')
+	__slots__ = _tFields
+
+class Collection(Node):
+	_tFields = Node._tFields + (
+		'separator', 'sources', 'coordinates', 'data', 'sci_contacts', 'usage'
+	)
+	__slots__ = _tFields
+
+class HttpStreamSrc(Node):
+	_tFields = Node._tFields + (
+		'convention', 'protocol', 'interface', 'format', 'tech_contacts', 'uris'
+	)
+	__slots__ = _tFields
+
+class FileAggregation(Node):
+	_tFields = Node._tFields + ('convention', 'tech_contacts', 'uris')
+	__slots__ = _tFields
+
+g_dNodeClasses = {
+	'Catalog':Catalog, 'Collection':Collection, 'HttpStreamSrc':HttpStreamSrc,
+	'FileAggregation':FileAggregation
+}
+
+# Shared sub-objects by content digest.  The pool only holds weak
+# references, so sub-objects go away with the last cached node using them.
+# Plain dicts and lists can't be weakly referenced, hence the subclasses.
+class _SharedDict(dict):
+	__slots__ = ('__weakref__',)
+
+class _SharedList(list):
+	__slots__ = ('__weakref__',)
+
+g_dSharedObjs = weakref.WeakValueDictionary()
+g_sharedLock = threading.Lock()
+
+def _compactValue(value):
+	"""Intern the strings in a JSON value and swap in shared copies of sub-
+	objects seen before.
+
+	Returns:
+		(value, yDigest) - The compacted value and a digest of it's content
+	"""
+	if isinstance(value, str):
+		if len(value) <= 128: value = sys.intern(value)
+		return (value, hashlib.sha1(b's' + value.encode('utf-8')).digest())
+
+	if isinstance(value, dict):
+		hasher = hashlib.sha1(b'd')
+		dOut = _SharedDict()
+		for sKey in value:
+			(sub, ySub) = _compactValue(value[sKey])
+			sKey = sys.intern(sKey)
+			dOut[sKey] = sub
+			hasher.update(sKey.encode('utf-8'))
+			hasher.update(ySub)
+		return _shareValue(dOut, hasher.digest())
+
+	if isinstance(value, list):
+		hasher = hashlib.sha1(b'l')
+		lOut = _SharedList()
+		for item in value:
+			(sub, ySub) = _compactValue(item)
+			lOut.append(sub)
+			hasher.update(ySub)
+		return _shareValue(lOut, hasher.digest())
+
+	# Numbers, booleans and null, the type name keeps True apart from 1
+	return (value, hashlib.sha1(
+		("%s:%r"%(type(value).__name__, value)).encode('utf-8')
+	).digest())
+
+def _shareValue(value, yDigest):
+	if len(value) == 0: return (value, yDigest)
+
+	with g_sharedLock:
+		shared = g_dSharedObjs.get(yDigest)
+		if shared is not None: return (shared, yDigest)
+
+		g_dSharedObjs[yDigest] = value
+
+	return (value, yDigest)
+
+def copyValue(value):
+	"""Deep copy a JSON value taken from a node.  Unlike copy.deepcopy()
+	sub-objects that are shared in the node become separate objects in the
+	copy, so the copy can be changed in place.
+	"""
+	if isinstance(value, dict):
+		return dict((sKey, copyValue(value[sKey])) for sKey in value)
+	if isinstance(value, list):
+		return [copyValue(item) for item in value]
+	return value
+
+def compactNode(dNode):
+	"""Get the compact, read-only form of a parsed node, see Node"""
+	dTop = {}
+	for sKey in dNode:
+		dTop[sys.intern(sKey)] = _compactValue(dNode[sKey])[0]
+
+	cls = g_dNodeClasses.get(dNode.get('type'))
+	if cls == None: return dTop
+	return cls(dTop)
+
+def memoryUse(obj):
+	"""Approximate bytes used by an object and everything it refers to,
+	counting shared objects once.
+	"""
+	nBytes = 0
+	setSeen = set()
+	lTodo = [obj]
+	while len(lTodo) > 0:
+		obj = lTodo.pop()
+		if id(obj) in setSeen: continue
+		setSeen.add(id(obj))
+		nBytes += sys.getsizeof(obj)
+
+		if isinstance(obj, dict):
+			lTodo.extend(obj.keys())
+			lTodo.extend(obj.values())
+		elif isinstance(obj, (list, tuple)):
+			lTodo.extend(obj)
+		elif isinstance(obj, Node):
+			for sKey in obj:
+				lTodo.append(sKey)
+				lTodo.append(obj[sKey])
+			if obj._extra != None: nBytes += sys.getsizeof(obj._extra)
+
+	return nBytes
+
+def nodeCacheStats():
+	"""Get the number of nodes in the in-memory cache and about how many
+	bytes they use.
+	"""
+	with g_lruLock:
+		lNodes = [tEnt[0] for tEnt in g_dNodeLru.values()]
+	return {'nodes':len(lNodes), 'bytes':memoryUse(lNodes)}
+
+
+#############################################################################
+# Get Node definition and path information by Id
+
+# Child key lengths for recently walked 'catalog' and 'sources' objects,
+# by object id.  Cached nodes are read-only so the lengths don't change,
+# each entry holds a reference to it's object so the id isn't reused.
+g_dChildLens = collections.OrderedDict()
+g_childLock = threading.Lock()
+
+def _childLens(dCat):
+	"""Get the distinct lengths of a catalog object's keys, longest first"""
+	with g_childLock:
+		tEnt = g_dChildLens.get(id(dCat))
+		if (tEnt != None) and (tEnt[0] is dCat):
+			g_dChildLens.move_to_end(id(dCat))
+			return tEnt[1]
+
+	tLens = tuple(sorted(set(len(sKey) for sKey in dCat), reverse=True))
+	with g_childLock:
+		g_dChildLens[id(dCat)] = (dCat, tLens)
+		while len(g_dChildLens) > max(g_nNodeCacheSize, 64):
+			g_dChildLens.popitem(last=False)
+	return tLens
+
+def _childSep(dEnt):
+	"""Get the separator a catalog entry's node uses for it's own children,
+	without fetching it.
+
+	Args:
+		dEnt: A 'catalog' or 'sources' entry
+
+	Returns:
+		The separator, "" for a null separator, or None if it isn't known.
+		It's known if the entry gives it, or if one of the entry's URLs is
+		in the memory or disk node cache.
+	"""
+	if not isinstance(dEnt, dict): return None
+
+	dSub = None
+	if 'separator' in dEnt:
+		dSub = dEnt
+	else:
+		for sUrl in dEnt.get('urls', []):
+			tEnt = _lruGet(sUrl)
+			if tEnt != None:
+				dSub = tEnt[0]
+				break
+			dHead = _cacheHead(sUrl)
+			if (dHead != None) and ('nav' in dHead):
+				dSub = dHead['nav']
+				break
+		if dSub == None: return None
+
+	if 'separator' not in dSub: return '/'
+	if dSub['separator'] == None: return ""
+	return dSub['separator']
+
+def _matchChildren(dCat, sWanted, iBeg):
+	"""Find the keys of a catalog object that match the requested path
+
+	Instead of testing every key, each prefix of the rest of the path that
+	could be a key is looked up directly, so wide catalogs cost no more than
+	narrow ones.
+
+	Args:
+		dCat: A node's 'catalog' or 'sources' object
+		sWanted: The requested catalog path
+		iBeg: Where the child keys start in sWanted, after the node's path
+			and separator
+
+	Returns:
+		The matching keys.  Keys that end on a path boundary come first,
+		longest first.  A key ends on a boundary if the rest of the path is
+		empty or starts with the child's separator.  If the separator isn't
+		known (see _childSep) any non-word character counts.  So "uiowa_test"
+		is tried before "uiowa", and "uiowa" is dropped once it's known to use
+		'/'.  Keys whose separator isn't known and that don't end on a
+		boundary are still returned, last, since the separator may be null.
+	"""
+	sRest = sWanted[iBeg:]
+	lBound = []
+	lOther = []
+	for nLen in _childLens(dCat):
+		if nLen > len(sRest): continue
+		sKey = sRest[:nLen]
+		if sKey not in dCat: continue
+
+		if nLen == len(sRest):
+			lBound.append(sKey)
+			continue
+
+		sSep = _childSep(dCat[sKey])
+		if sSep != None:
+			if sRest.startswith(sSep, nLen): lBound.append(sKey)
+		elif _isPathBreak(sKey[-1:]) or _isPathBreak(sRest[nLen]):
+			lBound.append(sKey)
+		else:
+			lOther.append(sKey)
+
+	return lBound + lOther
+
+def _isPathBreak(sChar):
+	return (len(sChar) > 0) and not (sChar.isalnum() or sChar in '_-.')
+
+def _getNode(lAttempted, lPathTo, lUrls, sPath, sWanted):
+
+	lTry = []
+	for sUrl in lUrls:
+		if sUrl not in lAttempted:
+			lTry.append(sUrl)
+		else:
+			# We have a loop, break it here
+			pout("Loop detected in catalog, at %s, needs to be fixed<br><br>"%sUrl)
+
+	if len(lTry) == 0:
+		return None
+
+	(dNode, sUrl) = _fetchFirst(lTry, lAttempted, True)
+	if dNode == None:
+		# Keep the breadcrumbs for a partial page
+		lReached = getattr(g_req, 'lReached', None)
+		if _isLate() and (lReached != None) and (len(lPathTo) > len(lReached)):
+			lReached[:] = lPathTo
+		return None
+	_noteDep(sUrl)
+	_learnPath(sPath, lUrls, lPathTo, sUrl)
+
+	bWanted = (sPath == sWanted) or (sPath[:-1] == sWanted) or \
+	          (sPath == sWanted[:-1])
+
+	# Only the node that's shown is needed in full
+	if bWanted and dNode.get('_nav'):
+		dNode = _fetchNode(sUrl)
+		if dNode == None:
+			return None
 
 	# Slide in the catalog path and the source URL so it stays attached
 	dNode['_url'] = sUrl
@@ -186,7 +1943,7 @@ def _getNode(lAttempted, lPathTo, sUrl, sPath, sWanted):
 	#pout("<p>Looking for '%s', I am at '%s'</p>"%(sWanted, lPathTo))
 	#return None
 	
-	if (sPath == sWanted) or (sPath[:-1] == sWanted) or (sPath == sWanted[:-1]):
+	if bWanted:
 		# This is the node you're looking for, note that the root catalog's
 		# _path is None, so setting None for the sWanted will match the root
 		return dNode
@@ -212,9 +1969,9 @@ def _getNode(lAttempted, lPathTo, sUrl, sPath, sWanted):
 		if sSep == None:
 			sSep = ""
 
-	# For each sub item append it's path to mine and see if the requested
-	# path starts with total child string
-	for sKey in dCat:
+	# Try the sub items whose path is a prefix of the requested path, best
+	# match first
+	for sKey in _matchChildren(dCat, sWanted, len(sPath) + len(sSep)):
 		sSubPath = "%s%s%s"%(sPath, sSep, sKey)
 
 		#pout("<p>Looking for %s, testing %s</p>\n"%(sWanted, sSubPath))
@@ -225,32 +1982,301 @@ def _getNode(lAttempted, lPathTo, sUrl, sPath, sWanted):
 		if not 'urls' in dCatEnt:
 			continue
 
-		for sUrl in dCatEnt['urls']:
-			# Going for a sub node, add in my information so that they can get
-			# back to me rapidly, but only if I'm part of the site hierarchy,
-			# other hierarchies aren't the focus of this browse tool
-			if sPath.startswith(g_sDefDas2SiteTag):
-				lPathTo.append(
-					(dNode['name'], dNode['title'], catPathToBrowseUrl(sPath) )
-				)
-				
-				dSubNode = _getNode(lAttempted, lPathTo, sUrl, sSubPath, sWanted)
-				if dSubNode != None:
-					return dSubNode
-				
-				lPathTo.pop()
-				
-			else:
-				dSubNode = _getNode(lAttempted, lPathTo, sUrl, sSubPath, sWanted)
-				if dSubNode != None:
-					return dSubNode
+		# Going for a sub node, add in my information so that they can get
+		# back to me rapidly, but only if I'm part of the site hierarchy,
+		# other hierarchies aren't the focus of this browse tool
+		if sPath.startswith(g_sDefDas2SiteTag):
+			lPathTo.append(
+				(dNode['name'], dNode['title'], catPathToBrowseUrl(sPath) )
+			)
+
+			dSubNode = _getNode(lAttempted, lPathTo, dCatEnt['urls'], sSubPath, sWanted)
+			if dSubNode != None:
+				return dSubNode
+
+			lPathTo.pop()
+
+		else:
+			dSubNode = _getNode(lAttempted, lPathTo, dCatEnt['urls'], sSubPath, sWanted)
+			if dSubNode != None:
+				return dSubNode
+
+	return None
+
+############################################################################
+# Path index lookup
+
+# Parsed index files by file name, each entry is (modification time, data,
+# prepared data).  Both are shared between threads and must not be changed.
+g_dIndexFiles = {}
+g_indexLock = threading.Lock()
+
+def _loadIndexFile(sFile, fnPrepare=None):
+	"""Read a JSON index file, reusing the last parse if it hasn't changed
+
+	Args:
+		sFile: The index file
+		fnPrepare: Optional function of the parsed file, for lookup tables
+			that are built once per parse instead of once per use
+
+	Returns:
+		(data, prepared) where prepared is the return value of fnPrepare,
+		or (None, None) if the file couldn't be read
+	"""
+	if not sFile: return (None, None)
+	try:
+		st = os.stat(sFile)
+	except OSError:
+		return (None, None)
+	nMtime = st.st_mtime
+	if not _trustedFile(sFile, st): return (None, None)
+
+	with g_indexLock:
+		tEnt = g_dIndexFiles.get(sFile)
+		if (tEnt == None) or (tEnt[0] != nMtime):
+			try:
+				with open(sFile, 'r', encoding='utf-8') as f:
+					data = json.load(f)
+			except (OSError, ValueError):
+				return (None, None)
+			tEnt = (nMtime, data, fnPrepare(data) if fnPrepare else None)
+			g_dIndexFiles[sFile] = tEnt
+
+	return (tEnt[1], tEnt[2])
+
+def _haveSearchIndex():
+	"""Check for a usable search index without reading it, the search box
+	depends on this
+	"""
+	if not g_sSearchIndex: return False
+	try:
+		st = os.stat(g_sSearchIndex)
+	except OSError:
+		return False
+	return _trustedFile(g_sSearchIndex, st)
+
+def _indexRecord(sLine):
+	"""Parse one line of the path index, None for junk"""
+	try:
+		lRec = json.loads(sLine)
+	except ValueError:
+		return None
+	if not isinstance(lRec, list) or (len(lRec) != 6): return None
+	if not isinstance(lRec[0], str): return None
+	return lRec
+
+def _indexFind(f, nBeg, nEnd, sKey):
+	"""Binary search the sorted lines of an open path index file
+
+	Only the lines on the way to the wanted one are read, so lookups stay
+	cheap no matter how big the catalog is.
+
+	Args:
+		f: The index file, opened in binary mode
+		nBeg: Offset of the first path line
+		nEnd: Size of the file
+		sKey: The catalog path to find
+
+	Returns:
+		The [path, parent, name, title, type, urls] record, or None
+	"""
+	# Invariant: the wanted line starts after nLo, and at or before the first
+	# line that starts after nHi
+	nLo = nBeg - 1
+	nHi = nEnd
+	while nHi - nLo > 1:
+		nMid = (nLo + nHi) // 2
+		f.seek(nMid)
+		f.readline()
+		lRec = _indexRecord(f.readline())
+		if (lRec == None) or (lRec[0] >= sKey):
+			nHi = nMid
+		else:
+			nLo = nMid
+
+	f.seek(nLo)
+	f.readline()
+	while f.tell() < nEnd:
+		lRec = _indexRecord(f.readline())
+		if lRec == None: return None
+		if lRec[0] == sKey: return lRec
+		if lRec[0] > sKey: return None
+	return None
+
+def _pathIndexLookup(sWanted):
+	"""Find a catalog path in the path index
+
+	The index is ignored if it's missing, unreadable, in an older format or
+	older than g_nPathIndexMaxAge.
+
+	Returns:
+		(sPath, dEntry) where sPath is the path as listed in the index and
+		dEntry has the node's 'urls' and the 'crumbs' leading to it as
+		[name, title, path] triplets.  (None, None) if not found.
+	"""
+	if not g_sPathIndex: return (None, None)
+	try:
+		st = os.stat(g_sPathIndex)
+		if not _trustedFile(g_sPathIndex, st): return (None, None)
+		f = open(g_sPathIndex, 'rb')
+	except OSError:
+		return (None, None)
+
+	with f:
+		try:
+			dHeader = json.loads(f.readline())
+		except ValueError:
+			return (None, None)
+		if not isinstance(dHeader, dict) or (dHeader.get('version') != 2):
+			return (None, None)
+		if time.time() - dHeader.get('generated', 0) > g_nPathIndexMaxAge:
+			return (None, None)
+		nBeg = f.tell()
+
+		# Same trailing separator slop as _getNode
+		for sPath in (sWanted, sWanted[:-1], sWanted + '/'):
+			lRec = _indexFind(f, nBeg, st.st_size, sPath)
+			if lRec != None: break
+		else:
+			return (None, None)
+
+		# Each record only names it's parent, follow them up to the root
+		lCrumbs = []
+		lUp = lRec
+		while lUp[1] != None:
+			lUp = _indexFind(f, nBeg, st.st_size, lUp[1])
+			if (lUp == None) or (len(lCrumbs) > 256): return (None, None)
+			lCrumbs.append([lUp[2], lUp[3], lUp[0]])
+
+	lCrumbs.reverse()
+	return (sPath, {'urls':lRec[5], 'type':lRec[4], 'crumbs':lCrumbs})
+
+
+############################################################################
+# Full text search
+
+g_setStopWords = set([
+	'an', 'and', 'are', 'as', 'at', 'by', 'for', 'from', 'in', 'is', 'it',
+	'of', 'on', 'or', 'the', 'this', 'to', 'with'
+])
+
+def searchTerms(sText):
+	"""Split text into lower case search terms.  Used both to build the search
+	index and to parse queries so that the two always agree.
+	"""
+	return [
+		s for s in re.findall(r'[a-z0-9]+', sText.lower())
+		if (len(s) > 1) and (s not in g_setStopWords)
+	]
+
+def searchCatalog(sQuery, nMax=50):
+	"""Look up catalog nodes in the search index
+
+	All query terms must match.  Terms of three or more letters also match
+	longer words that start with them, at half weight.
+
+	Args:
+		sQuery: The query text
+		nMax: The max number of hits to return
+
+	Returns:
+		A list of (score, path, name, title, type) tuples, best first, or None
+		if there is no search index.
+	"""
+	(dIndex, lSorted) = _loadIndexFile(
+		g_sSearchIndex, lambda dIndex: sorted(dIndex['terms'])
+	)
+	if dIndex == None: return None
+
+	lDocs = dIndex['docs']
+	dTerms = dIndex['terms']
+
+	dScores = None
+	for sWord in set(searchTerms(sQuery)):
+		lMatch = [(sWord, 1.0)] if sWord in dTerms else []
+		if len(sWord) > 2:
+			i = bisect.bisect_right(lSorted, sWord)
+			while (i < len(lSorted)) and lSorted[i].startswith(sWord) and \
+			      (len(lMatch) < 64):
+				lMatch.append( (lSorted[i], 0.5) )
+				i += 1
+
+		dHits = {}
+		for (sTerm, fBoost) in lMatch:
+			lPostings = dTerms[sTerm]
+			fIdf = math.log(1.0 + len(lDocs) / len(lPostings))
+			for (iDoc, fWeight) in lPostings:
+				fScore = fWeight * fIdf * fBoost
+				if fScore > dHits.get(iDoc, 0.0): dHits[iDoc] = fScore
+
+		if dScores == None:
+			dScores = dHits
+		else:
+			dScores = dict(
+				(iDoc, dScores[iDoc] + dHits[iDoc]) for iDoc in dScores if iDoc in dHits
+			)
+
+	if not dScores: return []
+
+	lRanked = sorted(dScores, key=lambda iDoc: (-dScores[iDoc], lDocs[iDoc][0]))
+	return [ tuple([dScores[iDoc]] + lDocs[iDoc]) for iDoc in lRanked[:nMax] ]
+
+
+############################################################################
+# Learned paths
+
+# Catalog path -> (time, URLs, breadcrumbs, URLs walked to get there)
+g_dLearned = collections.OrderedDict()
+g_learnLock = threading.Lock()
+
+def _learnPath(sPath, lUrls, lPathTo, sUrl):
+	"""Remember how a catalog path was reached, see g_nLearnedPaths"""
+	if (g_nLearnedPaths < 1) or (not sPath): return
+
+	# The nodes this request has used so far include the ones above this one
+	lDeps = list(getattr(g_req, 'lDeps', None) or [sUrl])
+
+	tEnt = (time.time(), list(lUrls), list(lPathTo), lDeps)
+	with g_learnLock:
+		g_dLearned[sPath] = tEnt
+		g_dLearned.move_to_end(sPath)
+		while len(g_dLearned) > g_nLearnedPaths:
+			g_dLearned.popitem(last=False)
+
+def _learnedAncestor(sWanted):
+	"""Find the longest remembered path that sWanted is, or is under
+
+	Returns:
+		(sPath, lUrls, lPathTo, lDeps) or None if nothing useful is known.
+		lPathTo is a fresh copy of the breadcrumbs leading to sPath and lDeps
+		are the node URLs walked through on the way.
+	"""
+	if g_nLearnedPaths < 1: return None
+
+	fNow = time.time()
+	with g_learnLock:
+		for i in range(len(sWanted), 0, -1):
+			sPath = sWanted[:i]
+			tEnt = g_dLearned.get(sPath)
+			if tEnt == None: continue
+			if fNow - tEnt[0] >= g_nCacheTTL: continue
+
+			# Has to end on a path boundary, "n1" isn't above "n10"
+			if (i < len(sWanted)) and not (_isPathBreak(sPath[-1]) or \
+			   _isPathBreak(sWanted[i])):
+				continue
+
+			g_dLearned.move_to_end(sPath)
+			return (sPath, tEnt[1], list(tEnt[2]), tEnt[3])
 
 	return None
 
+
 ############################################################################
-# We're stateless so we'll always have to navigate from the top down.  A real
-# app would cache nodes along the way making subsequent lookups faster.
-# libdas2 does this automatically
+# We're stateless so we'll always have to navigate from the top down, but
+# each hop is served from the node cache when possible (see _fetchNode),
+# the path index can skip the walk altogether, and long running processes
+# start from the deepest ancestor they've seen before
 
 def getNode(sWanted):
 	"""Get a catalog node item and return items along the path to it.
@@ -285,75 +2311,242 @@ def getNode(sWanted):
 	lPathTo = []
 
 	sLow = sWanted.lower()
-	if sLow.startswith('http') or sLow.startswith('https'):
+	if sLow.startswith('http') or sLow.startswith('file:'):
 		lAttempted.append(sWanted)
 
-		# just go get it, path information will be empty
+		# just go get it, path information will be empty
+		dNode = _fetchNode(sWanted)
+		if dNode != None:
+			_noteDep(sWanted)
+			dNode['_url'] = sWanted
+			dNode['_path'] = ""           # I did not walk a catalog to get here
+			                              # path information not available
+
+			return (dNode, lPathTo, lAttempted)
+
+	else:
+		(sPath, dEnt) = _pathIndexLookup(sWanted)
+		if dEnt != None:
+			(dNode, sUrl) = _fetchFirst(dEnt['urls'], lAttempted)
+			if dNode != None:
+				# The breadcrumbs came from the index, so it's a dependency too
+				_noteDep("file://%s"%urllib.request.pathname2url(
+					os.path.abspath(g_sPathIndex)
+				))
+				_noteDep(sUrl)
+				dNode['_url'] = sUrl
+				dNode['_path'] = sPath
+				for (sName, sTitle, sCrumbPath) in dEnt['crumbs']:
+					if sCrumbPath.startswith(g_sDefDas2SiteTag):
+						lPathTo.append(
+							(sName, sTitle, catPathToBrowseUrl(sCrumbPath))
+						)
+				return (dNode, lPathTo, lAttempted)
+
+			# Index is out of date or the host is down, walk the tree instead
+			lAttempted = []
+
+		tLearned = _learnedAncestor(sWanted)
+		if tLearned != None:
+			(sPath, lUrls, lPathTo, lDeps) = tLearned
+			for sDep in lDeps: _noteDep(sDep)
+			dNode = _getNode(lAttempted, lPathTo, lUrls, sPath, sWanted)
+			if dNode != None:
+				_count('das2cat_learned_paths_total', (('result', 'hit'),))
+				return (dNode, lPathTo, lAttempted)
+
+			# Something changed upstream, walk the tree instead
+			_count('das2cat_learned_paths_total', (('result', 'stale'),))
+			lAttempted = []
+			lPathTo = []
+		elif g_nLearnedPaths > 0:
+			_count('das2cat_learned_paths_total', (('result', 'miss'),))
+
+		sPath = ""
+		dNode = _getNode(lAttempted, lPathTo, g_lCatRoots, sPath, sWanted)
+		if dNode != None:
+			#pout("<p>Path is %s</p>"%lPathTo)
+			return (dNode, lPathTo, lAttempted)
+
+	return (None, [], lAttempted)
+
+def resolveMany(lWanted):
+	"""Get many catalog nodes at once.
+
+	Up to g_nFetchThreads paths are resolved at the same time, and a node
+	that's on the way to more than one of them, or is asked for by more
+	than one mirror race, is only read once.
+
+	Args:
+		lWanted: A list of catalog paths or direct URLs, as for getNode()
+
+	Returns:
+		A list of (dNode, lPathTo, lUrls) tuples from getNode(), in the same
+		order as lWanted
+	"""
+	bOwner = getattr(g_req, 'dShared', None) == None
+	if bOwner: g_req.dShared = {}
+	try:
+		if (len(lWanted) < 2) or (g_nFetchThreads < 2):
+			return [getNode(sWanted) for sWanted in lWanted]
+
+		pool = concurrent.futures.ThreadPoolExecutor(
+			max_workers=min(g_nFetchThreads, len(lWanted))
+		)
 		try:
-			res = requests.get(sWanted)
-			if res.status_code != requests.codes.ok:
-				return (None, [], lAttempted)
-			dNode = json.loads(res.text)
-			dNode['_url'] = sWanted
-			dNode['_path'] = ""           # I did not walk a catalog to get here
-			                              # path information not available
-													
-			return (dNode, lPathTo, lAttempted)
+			return list(pool.map(_withRequest(getNode), lWanted))
+		finally:
+			pool.shutdown(wait=True)
+	finally:
+		if bOwner: del g_req.dShared
 
-		except Exception as e:
-			#pout("Failed to get %s, reason: %s<br><br>\n"%(sUrl, str(e)))
-			pass
+############################################################################
 
-	else:
-		sPath = "" 
-		for sUrl in g_lCatRoots:
-			dNode = _getNode(lAttempted, lPathTo, sUrl, sPath, sWanted)
+def _fetchFirst(lUrls, lAttempted=None, bNav=False):
+	"""Get a node from the first of a list of mirror URLs to give a good reply.
+
+	Mirrors are tried fastest first.  If g_fHedgeDelay is set, the next
+	mirror is started whenever the ones in flight have been quiet for that
+	long, or as soon as one of them fails.  Slower requests are abandoned
+	(not cancelled) once one mirror answers, or once the request's deadline
+	passes.  Those still in flight at the deadline are noted as late, see
+	_noteLate().
+
+	Args:
+		lUrls: The mirror URLs for a single node
+		lAttempted: If not None, each URL is appended as it is tried
+		bNav: A navigation summary will do, see _fetchNode()
+
+	Returns:
+		(dNode, sUrl) or (None, None) if none of the URLs worked
+	"""
+	lUrls = _rankMirrors(lUrls)
+	if lAttempted == None: lAttempted = []
+
+	if (len(lUrls) < 2) or (not g_fHedgeDelay):
+		for sUrl in lUrls:
+			lAttempted.append(sUrl)
+			dNode = _fetchNode(sUrl, None, bNav)
 			if dNode != None:
-				#pout("<p>Path is %s</p>"%lPathTo)
-				return (dNode, lPathTo, lAttempted)
+				return (dNode, sUrl)
+		return (None, None)
 
-	return (None, [], lAttempted)
+	# Each mirror gets a daemon thread rather than a pool worker, so that
+	# requests still in flight when a winner is found don't hold up the end
+	# of the process (and with it the CGI response)
+	fetch = _withRequest(_fetchNode)
+	qDone = queue.Queue()
 
-############################################################################
+	def run(sUrl):
+		dNode = None
+		try:
+			dNode = fetch(sUrl, None, bNav)
+		finally:
+			qDone.put( (sUrl, dNode) )
+
+	lPending = []
+	iNext = 0
+	while True:
+		if iNext < len(lUrls):
+			sUrl = lUrls[iNext]
+			iNext += 1
+			lAttempted.append(sUrl)
+			threading.Thread(target=run, args=(sUrl,), daemon=True).start()
+			lPending.append(sUrl)
+		elif len(lPending) == 0:
+			return (None, None)
+
+		# Don't rely on the fetches timing out to keep the page deadline
+		fWait = g_fHedgeDelay
+		fLeft = _timeLeft()
+		if fLeft != None: fWait = max(min(fWait, fLeft), 0.0)
+
+		try:
+			(sUrl, dNode) = qDone.get(timeout=fWait)
+		except queue.Empty:
+			if (fLeft != None) and (_timeLeft() <= 0):
+				for sLate in lPending: _noteLate(sLate)
+				if _inRequest(): g_req.bIncomplete = True
+				return (None, None)
+			continue
+		lPending.remove(sUrl)
+		if dNode != None:
+			return (dNode, sUrl)
 
 def getDirectSubs(dNode, sListKey):
 	"""Get sub-nodes of a node.  Not used at part of normal getNode traversal.
 
+	Each sub-node is read from the first of it's 'urls' that works.  Up to
+	g_nFetchThreads sub-nodes are fetched at the same time so that one slow
+	or dead host doesn't hold up the rest.
+
 	Args:
 		dNode - The node for which sub-items are desired
 		sListKey - The key to the json object that lists the sub-nodes
 	returns:
 		A dictionary of direct sub-nodes which may be empty if no sub-nodes are
-		present
+		present.  Sub-nodes are listed in the same order as in dNode.
 	"""
 	dRet = {}
 	if sListKey not in dNode: return dRet
 
 	dSubs = dNode[sListKey]
+	lKeys = [sKey for sKey in dSubs if 'urls' in dSubs[sKey]]
 
-	for sKey in dSubs:
-		dCatEnt = dSubs[sKey]
+	def fetchSub(sKey):
+		return _fetchFirst(dSubs[sKey]['urls'])
 
-		for sUrl in dCatEnt['urls']:
-			try:
-				res = requests.get(sUrl)
-				if res.status_code != requests.codes.ok:
-					continue
-				dSubNode = json.loads(res.text)
-			except Exception as e:
-				pass   # Complain here?
-
-			# Slide in the source URL and path we took so it stays attached
-			dSubNode['_url'] = sUrl
-			sSep = '/'
-			if 'separator' in dNode:
-				sSep = dNode['separator']
-			if sSep == None:
-				sSep = ""
-				
-			dSubNode['_path'] = "%s%s%s"%(dNode['_path'], sSep, sKey)
-			dRet[sKey] = dSubNode
-			break
+	fBeg = time.perf_counter()
+	if (len(lKeys) > 1) and (g_nFetchThreads > 1):
+		nThreads = min(len(lKeys), g_nFetchThreads)
+		with concurrent.futures.ThreadPoolExecutor(max_workers=nThreads) as pool:
+			lResults = list(pool.map(_withRequest(fetchSub), lKeys))
+	else:
+		lResults = [fetchSub(sKey) for sKey in lKeys]
+	_addTime('subs', time.perf_counter() - fBeg)
+
+	sSep = '/'
+	if 'separator' in dNode:
+		sSep = dNode['separator']
+	if sSep == None:
+		sSep = ""
+
+	for (sKey, (dSubNode, sUrl)) in zip(lKeys, lResults):
+		if dSubNode == None:
+			# Don't cache a page with holes in it.  Callers outside of a
+			# request get the missing keys left out of the result instead.
+			if _inRequest(): g_req.bIncomplete = True
+			continue   # Complain here?
+		_noteDep(sUrl)
+
+		# Slide in the source URL and path we took so it stays attached
+		dSubNode['_url'] = sUrl
+		dSubNode['_path'] = "%s%s%s"%(dNode['_path'], sSep, sKey)
+		dRet[sKey] = dSubNode
+
+	return dRet
+
+
+def _lazySubs(dNode, sListKey):
+	"""Like getDirectSubs() but without fetching anything.  The sub-node
+	catalog entries are returned with their catalog '_path' added, they
+	have no '_url'.
+	"""
+	dRet = {}
+	if sListKey not in dNode: return dRet
+
+	sSep = '/'
+	if 'separator' in dNode:
+		sSep = dNode['separator']
+	if sSep == None:
+		sSep = ""
+
+	dSubs = dNode[sListKey]
+	for sKey in dSubs:
+		if 'urls' not in dSubs[sKey]: continue
+		dSub = dict(dSubs[sKey])
+		dSub['_path'] = "%s%s%s"%(dNode.get('_path', ''), sSep, sKey)
+		dRet[sKey] = dSub
 
 	return dRet
 
@@ -826,7 +3019,8 @@ def prnOptGroupForm(sCtrlPre, dParams, sGroup, dGroup, sSrcUrl, bVar=False):
 	# Weed out all the props that aren't settable
 	lSettable = []
 	for sProp in lProps:
-		if 'set' in dGroup[sProp]: lSettable.append(sProp)
+		if isinstance(dGroup[sProp], dict) and ('set' in dGroup[sProp]):
+			lSettable.append(sProp)
 	lProps = lSettable
 
 	for iProp in range(len(lProps)):
@@ -980,6 +3174,117 @@ def prnOptGroupForm(sCtrlPre, dParams, sGroup, dGroup, sSrcUrl, bVar=False):
 	return nCtrls
 
 
+def _isToggleVar(dVar):
+	"""Is the only settable aspect of a variable a boolean 'enabled' flag?"""
+	lSettable = [
+		sProp for sProp in dVar
+		if isinstance(dVar[sProp], dict) and ('set' in dVar[sProp])
+	]
+	if lSettable != ['enabled']: return False
+	return isinstance(dVar['enabled'].get('value'), bool)
+
+def _prnVarList(sCtrlPre, dParams, sListId, dVars, lVars):
+	"""Output on/off variables as a list that das2cat.js draws on demand
+
+	The rows are sent as JSON [control ID, value, checked, name, title]
+	arrays.  Control IDs are recorded in dParams just as prnOptGroupForm()
+	does for a checkbox, das2catSubmit() gets the state of rows that aren't
+	drawn from das2cat.js itself.
+
+	Returns:
+		The number of controls listed
+	"""
+	lRows = []
+	for sVar in lVars:
+		dVar = dVars[sVar]
+		dSet = dVar['enabled']['set']
+		sCtrlId = "%s_%s_enabled"%(sCtrlPre, sVar)
+
+		if 'flag' in dSet: sCtrlVal = dSet['flag']
+		elif 'pval' in dSet: sCtrlVal = dSet['pval']
+		else: sCtrlVal = "%s"%dVar['enabled']['value']
+
+		sName = dVar.get('name', sVar)
+		if 'title' in dVar: sInfo = dVar['title']
+		else: sInfo = sName
+
+		lRows.append(
+			[sCtrlId, sCtrlVal, dVar['enabled']['value'], sName, sInfo]
+		)
+
+		if 'flag' in dSet:
+			dParams[ dSet['param'] ]['flags'][ dSet['flag'] ]['_inCtrlId'] = sCtrlId
+		else:
+			dParams[ dSet['param'] ]['_inCtrlId'] = sCtrlId
+
+	sListId = "%s_%s_list"%(sCtrlPre, sListId)
+	sJson = json.dumps(lRows, ensure_ascii=False, separators=(',',':'))
+	pout('''<div class="das2cat_vlist" id="%s">
+<p><label for="%s_filter">%d variables, filter:</label>
+<input type="search" id="%s_filter"></p>
+<div class="srcopts_scroll_div"></div>
+<script type="application/json" id="%s_rows">%s</script>
+</div>'''%(sListId, sListId, len(lRows), sListId, sListId,
+	     sJson.replace('</', '<\\/')))
+
+	return len(lRows)
+
+def _prnVarGroups(sCtrlPre, dParams, sListId, dVars, lVars, sSrcUrl):
+	"""Output the option groups for a list of coordinate or data variables.
+
+	If there are g_nVarListMin or more variables that can only be turned on
+	and off, those are sent as a single filterable list, see _prnVarList().
+
+	Returns:
+		The number of controls created
+	"""
+	lToggles = [sVar for sVar in lVars if _isToggleVar(dVars[sVar])]
+	if (g_nVarListMin < 1) or (len(lToggles) < g_nVarListMin):
+		lToggles = []
+	lRest = [sVar for sVar in lVars if sVar not in lToggles]
+
+	nCtrls = 0
+	if len(lRest) > 0:
+		sStyle = ''
+		if len(lRest) > 12: sStyle = 'class="srcopts_scroll_div"'
+		pout('<div %s>'%sStyle)
+
+		for sVar in lRest:
+			nCtrls += prnOptGroupForm(
+				sCtrlPre, dParams, sVar, dVars[sVar], sSrcUrl, True
+			)
+		pout("</div>")
+
+	if len(lToggles) > 0:
+		nCtrls += _prnVarList(sCtrlPre, dParams, sListId, dVars, lToggles)
+
+	return nCtrls
+
+# Keys of http_params entries and flags that das2catSubmit() looks at
+g_tSubmitParamKeys = ('type', 'flag_sep', '_inCtrlId', '_inIfCtrlVal', '_outCtrlId')
+g_tSubmitFlagKeys  = ('value', 'prefix', '_inCtrlId', '_inIfCtrlVal')
+
+def _submitParams(dParams):
+	"""Trim http_params down to the parameters and flags that have form
+	controls, with only the keys needed to build the submitted values.
+	"""
+	dOut = {}
+	for sParam in dParams:
+		dParam = dParams[sParam]
+		if '_outCtrlId' not in dParam: continue
+
+		dTrim = dict((k, dParam[k]) for k in g_tSubmitParamKeys if k in dParam)
+		if 'flags' in dParam:
+			dTrim['flags'] = {}
+			for sFlag in dParam['flags']:
+				dFlag = dParam['flags'][sFlag]
+				if '_inCtrlId' not in dFlag: continue
+				dTrim['flags'][sFlag] = dict(
+					(k, dFlag[k]) for k in g_tSubmitFlagKeys if k in dFlag
+				)
+		dOut[sParam] = dTrim
+	return dOut
+
 def _getAction(sBase):
 	"""Get action from base url.  Basically return the URL with no GET params"""
 	n = sBase.find('?')
@@ -1028,15 +3333,15 @@ def prnHttpSource(dSrc, bSubSec=False):
 	
      	basename(_path) + http_params name
 	
-	5. An onSubmit function and is generated for the form with the following 
-	   name:
+	5. The parts of 'http_params' that have controls attached are written
+	   to a compact JSON data block with the id:
 	
-	     basename(_path) + "_OnSubmit"
+	     basename(_path) + "_download_params"
 	
-	   and the http_parmas element is added as a variable.  When called 
-	   onSubmit inspects the controls registered in 'http_params' and sets
-	   new control values.  Finnally the output controls that have data 
-	   values are given a name so that they can be submitted.
+	   Each submit button calls das2catSubmit() from the static das2cat.js
+	   (see g_sScript) which inspects the controls registered in the data
+	   block and sets new control values.  Finnally the output controls that
+	   have data values are given a name so that they can be submitted.
 	"""
 	
 	sSrcUrl = dSrc['_url']
@@ -1091,8 +3396,10 @@ def prnHttpSource(dSrc, bSubSec=False):
 	
 	_setHidden(dProto['base_urls'])
 
+	# Control IDs are written into the parameter definitions below, so work
+	# on a copy, the source node may be shared with other requests
 	dParams = None
-	if 'http_params' in dProto: dParams = dProto['http_params']
+	if 'http_params' in dProto: dParams = copyValue(dProto['http_params'])
 	nSettables = 0
 	
 	if 'interface' not in dSrc:
@@ -1121,22 +3428,16 @@ def prnHttpSource(dSrc, bSubSec=False):
 		if len(lMod) > 0:
 			pout('<fieldset><legend><b>Coordinate Options:</b></legend>')
 			
-			sStyle = ''
-			if len(lMod) > 12: sStyle = 'class="srcopts_scroll_div"'
-			pout('<div %s>'%sStyle)
-
 			lMod.sort()
 			if 'time' in lMod:
 				lMod.remove('time')
 				lMod.sort()
 				lMod = ['time'] + lMod
-			for sCoord in lMod:
-				# Function below writes control IDs into dParams
-				nSettables += prnOptGroupForm(
-					sBaseUri, dParams, sCoord, dCoords[sCoord], sSrcUrl, True
-				)
 
-			pout("</div>")
+			# Function below writes control IDs into dParams
+			nSettables += _prnVarGroups(
+				sBaseUri, dParams, 'coords', dCoords, lMod, sSrcUrl
+			)
 			pout('</fieldset>')
 	
 	# Handle setting data options.  There's no limit to these, but try to 
@@ -1164,17 +3465,10 @@ def prnHttpSource(dSrc, bSubSec=False):
 		if nDatOpts > 0:
 			pout('<fieldset><legend><b>Data Options:</b></legend>')
 			
-			sStyle = ''
-			if nDatOpts > 12: sStyle = 'class="srcopts_scroll_div"'
-			pout('<div %s>'%sStyle)
-			
 			lModVars.sort()
-			for sVar in lModVars:
-				nSettables += prnOptGroupForm(
-					sBaseUri, dParams, sVar, dData[sVar], sSrcUrl, True
-				)
-
-			pout("</div>")
+			nSettables += _prnVarGroups(
+				sBaseUri, dParams, 'data', dData, lModVars, sSrcUrl
+			)
 			pout("</fieldset>")
 
 		
@@ -1259,125 +3553,17 @@ def prnHttpSource(dSrc, bSubSec=False):
 				dParam['_outCtrlId'] = sCtrlId
 
 
-		# Stage 5, write the javascript that will be used on submit
-		sFuncName = "%s_onSubmit"%sBaseUri
-		sJson = json.dumps(dParams, ensure_ascii=False, indent=2, sort_keys=True)
+		# Stage 5, write the parameter data used by das2catSubmit() in
+		# das2cat.js when the form is submitted
 		sNamePrefix = "%s_"%sBaseUri
-		pout("""
-<script>
-function %s(sActionUrl) {
-	var dParams = %s;
-	
-	// Strip this from outgoing control id's, to get the output control
-	// name.  It was added to keep out controls from different forms separate.
-	var sNamePre = "%s";
-
-	for(var sParam in dParams){
-		dParam = dParams[sParam]
-		
-		if(!("_outCtrlId" in dParam)) continue;
-		var ctrlOut = document.getElementById(dParam["_outCtrlId"]);
-		var sOutName = dParam["_outCtrlId"].replace(sNamePre, "");
-		
-		// Flagset parameters, the most complicated ones
-		if( ('type' in dParam) && (dParam['type'] == 'flag_set')){
-		
-			if( !('flags' in dParam) ) continue;
-			
-			var dFlags = dParams[sParam]['flags'];
-			var sOutVal = "";
-			var sOutSep = " ";
-			if( 'flag_sep' in dParam) sOutSep = dParam['flag_sep'];
-			
-			for(var sFlag in dFlags){
-				var dFlag = dFlags[sFlag];
-				if( !('_inCtrlId' in dFlag) ) continue;
-				
-				var ctrlIn = document.getElementById(dFlag["_inCtrlId"]);
-				
-				// Check to see if we only add the output flag when the input
-				// has a certian value
-				if( '_inIfCtrlVal' in dFlag ){
-					if(ctrlIn.type == 'checkbox'){
-					
-						// If the state of the checkbox matches the send state then add the
-						// parameter.  This might mean than NOT checked sends a value.
-						if(dFlag['_inIfCtrlVal'] ==  ctrlIn.checked){
-							if((sOutSep.length > 0)&&(sOutVal.length > 0)) sOutVal += sOutSep;
-							sOutVal += dFlag['value'];
-						}
-					}
-					else{
-						if( ctrlIn.value == dFlag['_inIfCtrlVal']){
-							if((sOutSep.length > 0)&&(sOutVal.length > 0)) sOutVal += sOutSep;
-							sOutVal += dFlag['value'];
-						}
-					}
-				}
-				else{
-					// So the input sets the whole flag only set the output if something
-					// has changed.
-					if(ctrlIn.type == 'checkbox'){
-						if( ctrlIn.checked == true){
-							if((sOutSep.length > 0)&&(sOutVal.length > 0)) sOutVal += sOutSep;
-							if('prefix' in dFlag) sOutVal += dFlag['prefix'];
-							sOutVal += dFlag['value'];
-						}
-					}
-					else{
-						if( ctrlIn.value.length > 0){
-							if((sOutSep.length > 0)&&(sOutVal.length > 0)) sOutVal += sOutSep;
-							if('prefix' in dFlag) sOutVal += dFlag['prefix'];
-							sOutVal += ctrlIn.value;					
-						} 
-					}
-				}
-			}
-			
-			// Set control name and value if value changed
-			if(sOutVal.length > 0){
-				ctrlOut.name = sOutName;
-				ctrlOut.value = sOutVal;
-			}
-		}
-		
-		// TODO: Enum parameters
-		//else if ('type' in dParam) and (dParam['type'] == 'enum')){
-		//
-		//
-		//
-		//}
-		
-		// Generic parameters
-		else {
-			
-			if(!("_inCtrlId" in dParam)) continue;
-			var ctrlIn = document.getElementById(dParam["_inCtrlId"]);
-			
-			// Check boxes...
-			if(ctrlIn.getAttribute("type") == "checkbox"){
-				if(ctrlIn.checked == true){
-					// Text fields
-					ctrlOut.value = ctrlIn.value;
-					ctrlOut.name = sOutName;
-				}
-			} 
-			else {
-				if(ctrlIn.value.length > 0){
-					// Text fields
-					ctrlOut.value = ctrlIn.value;
-					ctrlOut.name = sOutName;
-				}
-			}
-		}
-	}
-
-	document.getElementById("%s").action = sActionUrl;
-}
-</script>
-	"""%(sFuncName, sJson, sNamePrefix, sFormId))
-
-		# Make one submit function per base url
+		sJson = json.dumps(
+			_submitParams(dParams), ensure_ascii=False, separators=(',',':'),
+			sort_keys=True
+		)
+		pout('<script type="application/json" id="%s_params">%s</script>'%(
+		     sFormId, sJson.replace('</', '<\\/')))
+
+		# Make one submit button per base url
 		if ('format' in dSrc) and ('default' in dSrc['format']) and \
 		   ('mime' in dSrc['format']['default']):
 			sMime = dSrc['format']['default']['mime']
@@ -1385,7 +3571,8 @@ function %s(sActionUrl) {
 			
 		for sBase in dProto['base_urls']:
 			pout('<input type="submit" value="Get from %s"'%_hostSimpleName(sBase) +\
-		     	' onclick=\'%s("%s");\'>'%(sFuncName, _getAction(sBase) ))
+		     	' onclick=\'das2catSubmit("%s", "%s", "%s");\'>'%(
+		     	sFormId, sNamePrefix, _getAction(sBase) ))
 
 	pout('</form>')
 
@@ -1395,14 +3582,27 @@ function %s(sActionUrl) {
 	
 	if 'uris' in dSrc and len(dSrc['uris']) > 0:
 		pout('<br>Permanent IDs:')
-		dSrc['uris'].sort()
-		for sUri in dSrc['uris']: pout(" &nbsp; <i>%s</i>"%sUri)
+		for sUri in sorted(dSrc['uris']): pout(" &nbsp; <i>%s</i>"%sUri)
 	
 	pout('</div>')	
 		  
 	pout('<hr class="datasrc_sep">')
 
 
+#############################################################################
+def prnSource(dSrc):
+	"""Output the body of a data source section, by source type"""
+	if dSrc['type'] == 'HttpStreamSrc':
+		prnHttpSource(dSrc, True)
+	elif dSrc['type'] == 'FileAggregation':
+		prnFileAgg(dSrc)
+	else:
+		pout("""
+<p>Data source type <b>%s</b> is unknown.  If this is a useful source type and
+not just a catalog error contact the maintainer of this das2 catalog browse
+client to request an upgrade.</p>
+"""%dSrc['type'] )
+
 #############################################################################
 def prnFileAgg(dNode):
 	pout("<h2>I'm a file aggregation</h2>")
@@ -1528,7 +3728,19 @@ def prnCollection(dNode):
 		pout('</p>')
 
 
-	dSubs = getDirectSubs(dNode, "sources")
+	# The source catalog entries have enough information to list them, the
+	# sources themselves are only needed to make the forms
+	if g_bLazySources and dNode.get('_path'):
+		dSubs = _lazySubs(dNode, "sources")
+	else:
+		dSubs = getDirectSubs(dNode, "sources")
+
+		# Sources that couldn't be read are listed anyway
+		dListed = _lazySubs(dNode, "sources")
+		for sKey in dListed:
+			if sKey in dSubs: continue
+			dListed[sKey]['_missing'] = True
+			dSubs[sKey] = dListed[sKey]
 
 	if len(dSubs) == 0:
 		pout("<p>Unfortunately, no sources are listed for this data collection</p>")
@@ -1544,23 +3756,29 @@ def prnCollection(dNode):
 	lSrcs.sort(key=_srcSortKeyFunc)
 
 	for dSrc in lSrcs:
-		sTmp = dSrc['type']
+		sTmp = dSrc.get('type', 'Unknown')
 		if 'convention' in dSrc: sTmp = dSrc['convention']
 		elif 'name' in dSrc: sTmp = dSrc['name']
 
 		pout('<div class="datasrc_div">')
 		pout("<h3><span>Access via %s</span></h3>"%sTmp)
 
-		if dSrc['type'] == 'HttpStreamSrc':
-			prnHttpSource(dSrc, True)
-		elif dSrc['type'] == 'FileAggregation':
-			prnFileAgg(dSrc)
+		if '_url' in dSrc:
+			prnSource(dSrc)
+		elif dSrc.get('_missing'):
+			if dNode.get('_path'):
+				sPage = catPathToBrowseUrl(dSrc['_path'])
+			else:
+				sPage = "%s?resolve=%s"%(scriptUrl(), urllib.parse.quote(dSrc['urls'][0]))
+			sWhy = " in time" if _isLate() else ""
+			pout('<p class="error">This source could not be read%s, '%sWhy+\
+			     'try <a href="%s">viewing it on it\'s own</a>.</p>'%sPage)
 		else:
-			pout("""
-<p>Data source type <b>%s</b> is unknown.  If this is a useful source type and
-not just a catalog error contact the maintainer of this das2 catalog browse
-client to request an upgrade.</p>
-"""%dSrc['type'] )
+			sPage = catPathToBrowseUrl(dSrc['_path'])
+			pout('<details class="das2cat_lazy" data-src="%s?fragment=source">'%sPage)
+			pout('<summary>Show query form</summary>')
+			pout('<p><a href="%s">View this source only</a></p>'%sPage)
+			pout('</details>')
 		pout("</div>")
 
 	
@@ -1573,6 +3791,31 @@ client to request an upgrade.</p>
 	pout('<hr class="code_sep">')
 
 
+#############################################################################
+def prnSearch(sQuery):
+
+	lHits = searchCatalog(sQuery)
+	if lHits == None:
+		pout('<p class="error">The search index is not available on this server</p>')
+		return
+
+	pout("<h3>Catalog entries matching <i>%s</i></h3>"%html.escape(sQuery))
+	if len(lHits) == 0:
+		pout("<p>No catalog entries matched</p>")
+		return
+
+	pout('<ul>')
+	for (fScore, sPath, sName, sTitle, sType) in lHits:
+		sClass = "cat_cat"
+		if sType == 'Collection':
+			sClass = "type_stream"
+		if not sTitle:
+			sTitle = "An untitled %s"%sType
+
+		pout('<li class="%s"><a href="%s">%s</a> - %s<br><i>%s</i></li>'%(
+		     sClass, catPathToBrowseUrl(sPath), sName, sTitle, sPath))
+	pout('</ul>')
+
 #############################################################################
 def prnCodeScript():
 	# small chunk of java script to make code examples collapse
@@ -1604,14 +3847,303 @@ def prnFooter():
   <div>%s</div>
   <div><a href="https://saturn.physics.uiowa.edu/svn/das2/clients/devel/browse">
   Download the code for this catalog client</a></div>
-</div>'''%os.getenv('SERVER_SIGNATURE')
+</div>'''%_getenv('SERVER_SIGNATURE')
 	)
 	pout("</body>\n</html>")
 
+#############################################################################
+# Rendered page cache
+
+g_dPageLru = collections.OrderedDict()
+g_pageLock = threading.Lock()
+
+def _pageFile(sKey):
+	sHash = hashlib.sha1(sKey.encode('utf-8')).hexdigest()
+	return os.path.join(g_sCacheDir, 'pages', sHash[:2], "%s.json"%sHash)
+
+def _pageKey(sWanted, bSearch, sFragment):
+	"""Everything other than the catalog nodes that changes a page"""
+	return json.dumps([sWanted, g_sTree, scriptUrl(), bSearch, sFragment])
+
+def _pageGet(sKey):
+	"""Get a cached page if none of the nodes that went into it have changed
+
+	Returns:
+		The page text, or None
+	"""
+	if (not g_bPageCache) or (not _cacheDir()): return None
+
+	dPage = None
+	with g_pageLock:
+		if sKey in g_dPageLru:
+			dPage = g_dPageLru[sKey]
+			g_dPageLru.move_to_end(sKey)
+
+	if dPage == None:
+		try:
+			with open(_pageFile(sKey), 'r', encoding='utf-8') as f:
+				dPage = json.load(f)
+		except (OSError, ValueError):
+			return None
+		if dPage.get('key') != sKey: return None
+
+	for (sUrl, sVersion) in dPage['deps']:
+		if nodeVersion(sUrl) != sVersion:
+			return None
+
+	_pageLruPut(sKey, dPage)
+	return dPage['html']
+
+def _pageLruPut(sKey, dPage):
+	if g_nPageCacheSize < 1: return
+
+	with g_pageLock:
+		g_dPageLru[sKey] = dPage
+		g_dPageLru.move_to_end(sKey)
+		while len(g_dPageLru) > g_nPageCacheSize:
+			g_dPageLru.popitem(last=False)
+
+def _pagePut(sKey, sHtml, lDeps):
+	"""Save a rendered page, unless one of it's nodes can't be versioned"""
+	if (not g_bPageCache) or (not _cacheDir()): return
+
+	lVersions = []
+	for sUrl in lDeps:
+		sVersion = nodeVersion(sUrl)
+		if sVersion == None: return
+		lVersions.append( [sUrl, sVersion] )
+
+	dPage = {'key':sKey, 'stored':time.time(), 'deps':lVersions, 'html':sHtml}
+
+	sFile = _pageFile(sKey)
+	try:
+		os.makedirs(os.path.dirname(sFile), exist_ok=True)
+		_cacheWrite(sFile, json.dumps(dPage, ensure_ascii=False))
+	except OSError:
+		pass
+	_pageLruPut(sKey, dPage)
+	_prunePages()
+
+def _prunePages():
+	"""Remove the oldest cached pages if there are more than g_nPageDiskMax,
+	down to 90% of that.  Only one process in g_nPagePruneDelay seconds
+	does this.
+	"""
+	sDir = os.path.join(g_sCacheDir, 'pages')
+	sMark = os.path.join(sDir, 'pruned')
+	try:
+		if time.time() - os.stat(sMark).st_mtime < g_nPagePruneDelay: return
+	except OSError:
+		pass
+
+	try:
+		with open(sMark, 'w'):
+			pass
+
+		lPages = []
+		for entSub in os.scandir(sDir):
+			if not entSub.is_dir(): continue
+			for ent in os.scandir(entSub.path):
+				if ent.name.endswith('.json'):
+					lPages.append( (ent.stat().st_mtime, ent.path) )
+	except OSError:
+		return
+
+	if len(lPages) <= g_nPageDiskMax: return
+
+	lPages.sort()
+	for (nMtime, sFile) in lPages[:len(lPages) - int(0.9*g_nPageDiskMax)]:
+		try:
+			os.unlink(sFile)
+		except OSError:
+			pass
+
+
 #############################################################################
 # Main
 
 def main(form):
+	"""Render a page, reusing a cached copy if the catalog hasn't changed
+
+	Page caching only happens inside a request, see beginRequest().
+	"""
+	lOut = getattr(g_req, 'lOut', None)
+	if lOut == None:
+		if 'bulk' in form: return _renderBulk(form)
+		if form.getfirst('fragment', ''): return _renderFragment(form)
+		return _render(form)
+
+	# Bulk answers depend on too many nodes to be worth caching
+	if 'bulk' in form:
+		nRet = _renderBulk(form)
+		g_req.nRet = nRet
+		return nRet
+
+	sFragment = form.getfirst('fragment', '').strip()
+	if sFragment not in ('', 'source'):
+		pout('<p class="error">Unknown fragment type</p>')
+		g_req.nRet = 13
+		return 13
+
+	# The resolved node is only known after resolution, but the page only
+	# depends on what was asked for
+	sKey = None
+	if len(form.getfirst('search', '').strip()) == 0:
+		fBeg = time.perf_counter()
+		sKey = _pageKey(
+			form.getfirst('resolve', '').strip().lower() or _getenv("PATH_INFO"),
+			_haveSearchIndex(), sFragment
+		)
+		sHtml = _pageGet(sKey)
+		_addTime('page', time.perf_counter() - fBeg)
+		if sHtml != None:
+			lOut.append(sHtml)
+			_count('das2cat_page_cache_total', (('result', 'hit'),))
+			g_req.sPageCache = 'hit'
+			g_req.nRet = 0
+			return 0
+		if g_bPageCache and _cacheDir(): g_req.sPageCache = 'miss'
+
+	iBeg = len(lOut)
+	if sFragment: nRet = _renderFragment(form)
+	else:         nRet = _render(form)
+	if g_req.sPageCache == 'miss':
+		_count('das2cat_page_cache_total', (('result', 'miss'),))
+	if (nRet == 0) and (sKey != None) and (not g_req.bIncomplete) and \
+	   (not _isLate()):
+		fBeg = time.perf_counter()
+		_pagePut(sKey, ''.join(lOut[iBeg:]), g_req.lDeps)
+		_addTime('page', time.perf_counter() - fBeg)
+
+	g_req.nRet = nRet
+	return nRet
+
+def _observeRender(dNode, fSec):
+	sType = dNode.get('type')
+	if sType not in g_dNodeClasses: sType = 'other'
+	_observe('das2cat_render_seconds', (('type', sType),), fSec)
+
+def _resolveRequest(form):
+	"""Find the catalog node a request is asking for
+
+	Returns:
+		(sPath, dNode, lPathTo, lTried) - The path asked for and the return
+		values of getNode()
+	"""
+	fBeg = time.perf_counter()
+	try:
+		return _resolvePath(form)
+	finally:
+		_addTime('resolve', time.perf_counter() - fBeg)
+
+def _queryPath(sPath):
+	"""Normalize a catalog path or URL given in the query string, paths
+	that aren't tags are taken to be under the default site tree
+	"""
+	sPath = sPath.strip().lower()
+	if sPath.startswith('http') or sPath.startswith('file:'):
+		return sPath
+	if not sPath.startswith('tag:'):
+		sPath = "%s:/%s"%(g_sDefDas2SiteTag, sPath)
+	return sPath
+
+def _resolvePath(form):
+	# What ID do they want to know about, can be given as a query id or as
+	# path info, or just a direct URL that skips the whole resolution stage
+	sPath = form.getfirst('resolve', '').strip()
+
+	if len(sPath) > 0:
+		sPath = _queryPath(sPath)
+
+		# We can get direct urls via the resolver, so check for that
+		if sPath.startswith('http') or sPath.startswith('file:'):
+			(dNode, lPathTo, lTried) = getNode(sPath)
+
+			if dNode != None:
+				sPath = dNode['_path']
+			else:
+				sPath = None
+		else:
+			(dNode, lPathTo, lTried) = getNode(sPath)
+	else:
+		sPathInfo = ''
+		if _getenv("PATH_INFO"):
+			sPathInfo = _getenv("PATH_INFO")
+		sPath = pathInfoToCatId(sPathInfo)
+
+		(dNode, lPathTo, lTried) = getNode(sPath)
+
+	return (sPath, dNode, lPathTo, lTried)
+
+def _renderBulk(form):
+	"""Resolve many catalog paths in one request and output the nodes as
+	JSON.  Each 'bulk' query value is one path or URL, or several separated
+	by new lines, so a list can be POSTed as a single form field.
+
+	The output is an object with a 'results' list, one entry per path in the
+	order given.  Each entry has the 'request' as given and either the
+	resolved 'path', 'url', breadcrumbs ('crumbs', as [name, title,
+	browse url] triplets) and 'node', or an 'error' and the URLs 'tried'.
+	'incomplete' is true if some paths weren't resolved because the request
+	ran out of time, see g_fPageBudget.
+	"""
+	lRequest = []
+	for sValue in form.getlist('bulk'):
+		lRequest += [s.strip() for s in sValue.splitlines() if s.strip()]
+
+	if hasattr(g_req, 'sType'): g_req.sType = "application/json"
+
+	if len(lRequest) > g_nBulkMax:
+		pout(json.dumps({
+			'error':"At most %d paths may be resolved at once"%g_nBulkMax
+		}))
+		return 13
+
+	# Loop warnings and the like aren't JSON, keep them out of the reply
+	lOut = getattr(g_req, 'lOut', None)
+	g_req.lOut = []
+	try:
+		fBeg = time.perf_counter()
+		lFound = resolveMany([_queryPath(s) for s in lRequest])
+		_addTime('resolve', time.perf_counter() - fBeg)
+	finally:
+		if lOut != None: g_req.lOut = lOut
+		else:            del g_req.lOut
+
+	lResults = []
+	for (sRequest, (dNode, lPathTo, lTried)) in zip(lRequest, lFound):
+		if dNode == None:
+			sError = "Could not be reached in time" if _isLate() else "Not found"
+			lResults.append({'request':sRequest, 'error':sError, 'tried':lTried})
+		else:
+			lResults.append({
+				'request':sRequest, 'path':dNode['_path'], 'url':dNode['_url'],
+				'crumbs':[list(tCrumb) for tCrumb in lPathTo], 'node':dNode
+			})
+
+	pout(json.dumps(
+		{'results':lResults, 'incomplete':_isLate()}, ensure_ascii=False
+	))
+	return 0
+
+def _renderFragment(form):
+	"""Output just the form for a single data source, no page around it.
+	This is what lazy collection pages load when a source is opened.
+	"""
+	(sPath, dNode, lPathTo, lTried) = _resolveRequest(form)
+
+	if dNode == None:
+		sWhy = "could not be read in time" if _isLate() else "doesn't exist"
+		pout('<p class="error">Catalog node <b>%s</b> %s</p>'%(
+		     html.escape("%s"%sPath), sWhy))
+		return 13
+
+	fBeg = time.perf_counter()
+	prnSource(dNode)
+	_observeRender(dNode, time.perf_counter() - fBeg)
+	return 0
+
+def _render(form):
 
 	sScript = scriptUrl()
 	if sScript.startswith("https"):
@@ -1621,12 +4153,15 @@ def main(form):
 
 	sTree = g_sTree[0].upper() + g_sTree[1:]
 
+	pout("<!DOCTYPE html>")
+	pout("<html>")
 	pout("""
 <head>
 	<title>Das2 %s Catalog</title>
 	<link rel="stylesheet" type="text/css" media="screen" href="%s%s" />
+	<script src="%s%s" defer></script>
 </head>
-"""%(sTree, sProto, g_sStyleSheet))
+"""%(sTree, sProto, g_sStyleSheet, sProto, g_sScript))
 
 	pout('''
 <body>
@@ -1656,32 +4191,14 @@ def main(form):
 ''')
 
 
-	# What ID do they want to know about, can be given as a query id or as
-	# path info, or just a direct URL that skips the whole resolution stage
-	sPath = form.getfirst('resolve', '').strip()
-	sPath = sPath.lower()
-
-	if len(sPath) > 0:
-		# We can get direct urls via the resolver, so check for that
-		if sPath.startswith('http'):
-			(dNode, lPathTo, lTried) = getNode(sPath)
-
-			if dNode != None:
-				sPath = dNode['_path']
-			else:
-				sPath = None
-		else:
-			if not sPath.startswith('tag:'):
-				sPath = "%s:/%s"%(g_sDefDas2SiteTag, sPath)
+	# Searches don't look at the catalog at all, only at the search index
+	sQuery = form.getfirst('search', '').strip()
 
-			(dNode, lPathTo, lTried) = getNode(sPath)
+	if len(sQuery) > 0:
+		sPath = ''
+		(dNode, lPathTo, lTried) = (None, [], [])
 	else:
-		sPathInfo = ''
-		if os.getenv("PATH_INFO"):
-			sPathInfo = os.getenv("PATH_INFO")
-		sPath = pathInfoToCatId(sPathInfo)
-
-		(dNode, lPathTo, lTried) = getNode(sPath)
+		(sPath, dNode, lPathTo, lTried) = _resolveRequest(form)
 
 
 	pout('''
@@ -1694,8 +4211,34 @@ def main(form):
 </form>
 '''%(scriptUrl(), sPath))
 
+	if _haveSearchIndex():
+		pout('''
+<form action="%s" >
+<div class="resolver">
+  <label for="search_text">Search Names and Titles</label>
+  <input type="text" id="search_text" name="search" value="%s">
+  <input type="submit" value="Search" >
+</div>
+</form>
+'''%(scriptUrl(), html.escape(sQuery, quote=True)))
+
 	pout('<div class="main">')
 
+	if len(sQuery) > 0:
+		prnSearch(sQuery)
+		pout("</div>")
+		prnFooter()
+		return 0
+
+	if (dNode == None) and _isLate():
+		prnBrowseBar(g_req.lReached, {'name':'&hellip;'})
+		pout('<p class="error">Catalog node <b>%s</b> could not be reached in '%sPath+\
+		     'time, the catalog servers on the way to it are slow or down.  '+\
+		     'Reload the page to try again.</p>')
+		pout("</div>")
+		prnFooter()
+		return 13
+
 	if dNode == None:
 		pout("<p>Catalog node <b>%s</b> doesn't exist</p>"%sPath)
 		pout("<p>Lookup path follows:</p>\n<ul>")
@@ -1714,6 +4257,11 @@ def main(form):
 
 	prnBrowseBar(lPathTo, dNode)
 
+	# Room for a note at the top if time runs out while rendering
+	lOut = getattr(g_req, 'lOut', None)
+	iNote = len(lOut) if lOut != None else None
+
+	fBeg = time.perf_counter()
 	if dNode['type'] == 'Catalog':
 		prnCatalog(dNode)
 	elif dNode['type'] == 'Collection':
@@ -1727,6 +4275,13 @@ def main(form):
 		sOut = json.dumps(dNode, ensure_ascii=False, indent="  ", sort_keys=True)
 		pout(sOut)
 		pout("</pre>")
+	_observeRender(dNode, time.perf_counter() - fBeg)
+
+	if (iNote != None) and _isLate():
+		lOut.insert(iNote,
+			'<p class="error">Some parts of this page are missing, the catalog '+\
+			'servers didn\'t all answer in time.  Reload the page to try again.</p>\n'
+		)
 
 	pout("</div>")
 
@@ -1739,7 +4294,20 @@ def main(form):
 ##############################################################################
 # Stub main for cgi
 
-form = cgi.FieldStorage()
+if __name__ == '__main__':
+	lOut = []
+	beginRequest(os.environ, lOut)
+	form = cgi.FieldStorage()
 
-# Return values don't matter in CGI programming.  That's unfortunate
-main(form)
+	# Return values don't matter in CGI programming.  That's unfortunate
+	main(form)
+	dRec = endRequest()
+
+	(yBody, lHeaders) = encodeResponse(
+		lOut, os.getenv('HTTP_ACCEPT_ENCODING'), dRec['type']
+	)
+	lHeaders.append( ('Server-Timing', serverTiming(dRec)) )
+	sHeaders = "".join(["%s: %s\r\n"%(sKey, sVal) for (sKey, sVal) in lHeaders])
+	sys.stdout.buffer.write(("%s\r\n"%sHeaders).encode('latin-1'))
+	sys.stdout.buffer.write(yBody)
+	sys.stdout.buffer.flush()
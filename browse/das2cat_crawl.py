@@ -0,0 +1,223 @@
+#!/usr/bin/python3
+
+# Federated catalog crawler for das2cat_cgi_browse.py, same license (MIT)
+# as the CGI script.
+#
+# Walks every 'catalog' and 'sources' entry reachable from the root catalog,
+# including the remote site catalogs, fetching up to --threads nodes at a
+# time.  Every node that can be read is saved to a snapshot directory:
+#
+#    DIR/manifest.json  - Catalog path -> URL, type and node file, plus the
+#                         list of nodes that couldn't be read and totals
+#    DIR/fetches.jsonl  - One record per URL tried: time taken, HTTP status,
+#                         bytes, cache outcome and error if any
+#    DIR/paths.jsonl    - A path index, see das2cat_index.py
+#    DIR/search.json    - A full text search index for the browse script
+#    DIR/nodes/*.json   - The nodes themselves, named by a hash of the path
+#
+# Nodes pass through the browse script's node cache on the way so a crawl
+# also pre-warms the cache for the CGI script.
+
+import sys
+import os
+import time
+import json
+import hashlib
+import argparse
+import concurrent.futures
+
+import das2cat_cgi_browse as browse
+import das2cat_indexfile
+
+##############################################################################
+def _crawlNode(lUrls, sPath, sNodeDir):
+	"""Read a single node from the first of it's URLs that works and save it
+
+	Returns:
+		(dNode, sUrl, sFile, lFetches) where dNode is None if no URL worked,
+		and lFetches has one record for each URL tried
+	"""
+	lFetches = []
+	for sUrl in browse._rankMirrors(lUrls):
+		dInfo = {}
+		fBeg = time.time()
+		dNode = browse._fetchNode(sUrl, dInfo)
+		dInfo['seconds'] = round(time.time() - fBeg, 6)
+		dInfo['url'] = sUrl
+		dInfo['host'] = browse._urlHost(sUrl)
+		dInfo['path'] = sPath
+		dInfo['ok'] = dNode != None
+		lFetches.append(dInfo)
+
+		if dNode == None: continue
+
+		sFile = "%s.json"%hashlib.sha1(sPath.encode('utf-8')).hexdigest()
+		with open(os.path.join(sNodeDir, sFile), 'w', encoding='utf-8') as f:
+			json.dump(dNode, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+		return (dNode, sUrl, sFile, lFetches)
+
+	return (None, None, None, lFetches)
+
+
+def crawl(lRoots, sOutDir, nThreads):
+	"""Crawl the federated catalog and write a snapshot directory
+
+	Args:
+		lRoots: Mirror URLs for the root catalog
+		sOutDir: The snapshot directory, created if needed
+		nThreads: Max number of nodes to fetch at the same time
+
+	Returns:
+		The manifest dictionary, which is also saved as DIR/manifest.json
+	"""
+	sNodeDir = os.path.join(sOutDir, 'nodes')
+	os.makedirs(sNodeDir, exist_ok=True)
+
+	dNodes = {}
+	dPaths = {}
+	lSearch = []
+	lFailed = []
+	setSeen = set()
+	nFetches = 0
+	nBytes = 0
+
+	fBeg = time.time()
+	fLog = open(os.path.join(sOutDir, 'fetches.jsonl'), 'w', encoding='utf-8')
+	pool = concurrent.futures.ThreadPoolExecutor(max_workers=nThreads)
+	dPending = {}
+
+	def submit(lUrls, sPath, sParent):
+		# Global loop detection, a URL is only ever crawled once
+		lUrls = [sUrl for sUrl in lUrls if sUrl not in setSeen]
+		if len(lUrls) == 0: return
+		setSeen.update(lUrls)
+		fut = pool.submit(_crawlNode, lUrls, sPath, sNodeDir)
+		dPending[fut] = (lUrls, sPath, sParent)
+
+	submit(list(lRoots), "", None)
+
+	try:
+		while len(dPending) > 0:
+			(setDone, setNotDone) = concurrent.futures.wait(
+				dPending, return_when=concurrent.futures.FIRST_COMPLETED
+			)
+			for fut in setDone:
+				(lUrls, sPath, sParent) = dPending.pop(fut)
+				(dNode, sUrl, sFile, lFetches) = fut.result()
+
+				for dFetch in lFetches:
+					fLog.write("%s\n"%json.dumps(dFetch, sort_keys=True))
+					nBytes += dFetch.get('bytes', 0)
+				nFetches += len(lFetches)
+
+				if dNode == None:
+					lFailed.append({'path':sPath, 'urls':lUrls})
+					continue
+
+				dNodes[sPath] = {'url':sUrl, 'type':dNode.get('type'), 'file':sFile}
+				dPaths[sPath] = das2cat_indexfile.pathEntry(dNode, sPath, lUrls, sParent)
+				lSearch.append(das2cat_indexfile.searchEntry(sPath, dNode))
+				for (lSubUrls, sSubPath) in das2cat_indexfile.subEntries(dNode, sPath):
+					submit(lSubUrls, sSubPath, sPath)
+	finally:
+		pool.shutdown(wait=True)
+		fLog.close()
+
+	dManifest = {
+		'generated':time.time(), 'roots':list(lRoots), 'nodes':dNodes,
+		'failed':lFailed,
+		'totals':{
+			'nodes':len(dNodes), 'failed':len(lFailed), 'fetches':nFetches,
+			'bytes':nBytes, 'seconds':round(time.time() - fBeg, 3)
+		}
+	}
+	with open(os.path.join(sOutDir, 'manifest.json'), 'w', encoding='utf-8') as f:
+		json.dump(dManifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+	das2cat_indexfile.writePathIndex(os.path.join(sOutDir, 'paths.jsonl'), lRoots, dPaths)
+	das2cat_indexfile.writeSearchIndex(os.path.join(sOutDir, 'search.json'), lSearch)
+
+	return dManifest
+
+
+def _hostSummary(sOutDir):
+	"""Per-host fetch counts, failures and mean time from DIR/fetches.jsonl"""
+	dHosts = {}
+	with open(os.path.join(sOutDir, 'fetches.jsonl'), 'r', encoding='utf-8') as f:
+		for sLine in f:
+			dFetch = json.loads(sLine)
+			lStats = dHosts.setdefault(dFetch['host'], [0, 0, 0.0])
+			lStats[0] += 1
+			if not dFetch['ok']: lStats[1] += 1
+			lStats[2] += dFetch['seconds']
+	return dHosts
+
+
+def _memorySummary(sOutDir, dManifest):
+	"""Memory needed to hold every saved node as parsed dictionaries and in
+	the compact form used by the browse script's in-memory cache.
+	"""
+	lNodes = []
+	for sPath in dManifest['nodes']:
+		sFile = os.path.join(sOutDir, 'nodes', dManifest['nodes'][sPath]['file'])
+		with open(sFile, 'r', encoding='utf-8') as f:
+			lNodes.append(json.load(f))
+
+	nDict = browse.memoryUse(lNodes)
+	nCompact = browse.memoryUse([browse.compactNode(dNode) for dNode in lNodes])
+	return (nDict, nCompact)
+
+
+##############################################################################
+def main(argv):
+	psr = argparse.ArgumentParser(
+		description="Crawl the federated das2 catalog and write a local "+\
+		            "snapshot of every reachable node"
+	)
+	psr.add_argument('out_dir', help="Snapshot output directory")
+	psr.add_argument('-r', '--root', action='append', dest='lRoots',
+		help="Root catalog URL, may be given more than once, defaults to "+\
+		     "the browse script roots")
+	psr.add_argument('-t', '--threads', type=int, default=8,
+		help="Max number of nodes to fetch at once, defaults to %(default)s")
+	psr.add_argument('-c', '--use-cache', action='store_true',
+		help="Use fresh node cache entries instead of asking the upstream "+\
+		     "servers for every node")
+	psr.add_argument('-m', '--memory', action='store_true',
+		help="Report how much memory the saved nodes take up as plain "+\
+		     "dictionaries and in the browse script's compact form")
+
+	opts = psr.parse_args(argv[1:])
+	lRoots = opts.lRoots if opts.lRoots else browse.g_lCatRoots
+
+	if not opts.use_cache:
+		browse.g_nCacheTTL = 0
+
+	dManifest = crawl(lRoots, opts.out_dir, max(opts.threads, 1))
+
+	dTot = dManifest['totals']
+	browse.perr("%d nodes saved, %d unreachable, %d fetches, %d bytes in %.2f s"%(
+	            dTot['nodes'], dTot['failed'], dTot['fetches'], dTot['bytes'],
+	            dTot['seconds']))
+
+	dHosts = _hostSummary(opts.out_dir)
+	for sHost in sorted(dHosts):
+		(nFetch, nFail, fSec) = dHosts[sHost]
+		browse.perr("   %-40s %5d fetches %5d failed %8.3f s mean"%(
+		            sHost, nFetch, nFail, fSec/nFetch))
+
+	if opts.memory:
+		(nDict, nCompact) = _memorySummary(opts.out_dir, dManifest)
+		browse.perr("Memory for %d nodes: %d bytes as dictionaries, %d compact (%.0f%%)"%(
+		            len(dManifest['nodes']), nDict, nCompact, 100.0*nCompact/max(nDict, 1)))
+
+	for dFail in dManifest['failed']:
+		browse.perr("WARNING: Couldn't read %s from %s"%(
+		            dFail['path'], ", ".join(dFail['urls'])))
+
+	if dTot['nodes'] == 0: return 3
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+
+# Path index generator for das2cat_cgi_browse.py, same license (MIT) as the
+# CGI script.
+#
+# Resolving a deep catalog path means fetching every node from the root
+# on down.  This program crawls the federated catalog once with
+# das2cat_crawl.py and writes a flat map of every catalog path to the URLs,
+# name and title of that node and the path of it's parent.  The browse script
+# uses the map to fetch the wanted node directly and rebuilds the breadcrumbs
+# from the parent paths.  The file is a JSON header line followed by one JSON
+# line per path, sorted by path, so that the browse script can binary search
+# it instead of parsing the whole thing, see das2cat_indexfile.py.  Run it
+# from cron, for example:
+#
+#    ./das2cat_index.py -o /var/cache/das2cat/paths.jsonl
+
+import sys
+import os
+import shutil
+import tempfile
+import argparse
+
+import das2cat_cgi_browse as browse
+import das2cat_crawl
+import das2cat_indexfile
+
+##############################################################################
+def main(argv):
+	psr = argparse.ArgumentParser(
+		description="Write a flat path index of the federated das2 catalog"
+	)
+	psr.add_argument('-o', '--output', default=browse.g_sPathIndex,
+		help="Output file, defaults to %(default)s")
+	psr.add_argument('-r', '--root', action='append', dest='lRoots',
+		help="Root catalog URL, may be given more than once, defaults to "+\
+		     "the browse script roots")
+	psr.add_argument('-t', '--threads', type=int, default=8,
+		help="Max number of nodes to fetch at once, defaults to %(default)s")
+
+	opts = psr.parse_args(argv[1:])
+	lRoots = opts.lRoots if opts.lRoots else browse.g_lCatRoots
+
+	# The crawler builds the index as it goes, keep just that part
+	sTmpDir = tempfile.mkdtemp(prefix='das2cat_index.')
+	try:
+		dManifest = das2cat_crawl.crawl(lRoots, sTmpDir, max(opts.threads, 1))
+		with open(os.path.join(sTmpDir, 'paths.jsonl'), 'r', encoding='utf-8') as f:
+			das2cat_indexfile.writeIndexText(opts.output, f.read())
+	finally:
+		shutil.rmtree(sTmpDir, ignore_errors=True)
+
+	for dFail in dManifest['failed']:
+		browse.perr("WARNING: Couldn't read %s from %s"%(
+		            dFail['path'], ", ".join(dFail['urls'])))
+
+	nPaths = len(dManifest['nodes'])
+	browse.perr("%d catalog paths written to %s"%(nPaths, opts.output))
+
+	if nPaths == 0: return 3
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,160 @@
+
+# Path and search index formats for das2cat_cgi_browse.py, same license
+# (MIT) as the CGI script.
+#
+# The functions here are shared by das2cat_crawl.py, which builds both
+# indexes as it walks the catalog, and das2cat_index.py, which just writes
+# the path index.  Keeping them in their own module lets those two import
+# in one direction only.  See _pathIndexLookup() and searchCatalog() in the
+# browse script for the readers.
+
+import os
+import time
+import json
+
+import das2cat_cgi_browse as browse
+
+##############################################################################
+def subEntries(dNode, sPath):
+	"""Get the child entries of a node in the same way _getNode sees them
+
+	Args:
+		dNode: A Catalog or Collection node
+		sPath: The catalog path of dNode
+
+	Returns:
+		A list of (urls, path) tuples, one for each child that has a 'urls'
+		list.
+	"""
+	sCatElement = 'catalog'
+	if dNode.get('type') == 'Collection':
+		sCatElement = 'sources'
+	if sCatElement not in dNode: return []
+
+	sSep = '/'
+	if 'separator' in dNode:
+		sSep = dNode['separator']
+		if sSep == None: sSep = ""
+
+	lSubs = []
+	for sKey in dNode[sCatElement]:
+		dEnt = dNode[sCatElement][sKey]
+		if 'urls' not in dEnt: continue
+		lSubs.append( (dEnt['urls'], "%s%s%s"%(sPath, sSep, sKey)) )
+
+	return lSubs
+
+
+def pathEntry(dNode, sPath, lUrls, sParent):
+	"""Get the path index entry for a single node
+
+	Args:
+		dNode: The node
+		sPath: The catalog path of dNode
+		lUrls: The mirror URLs for dNode
+		sParent: The catalog path of the node that listed dNode, None for the
+			root catalog
+
+	Returns:
+		A dictionary with the keys 'urls', 'type', 'name', 'title' and
+		'parent'
+	"""
+	return {
+		'urls':lUrls, 'type':dNode.get('type'), 'name':dNode.get('name', sPath),
+		'title':dNode.get('title', ''), 'parent':sParent
+	}
+
+
+def writeIndexText(sFile, sText):
+	"""Save an index file that's already been formatted"""
+	# The default location is in the browse script's cache directory, which
+	# has to be private, see _cacheDir()
+	os.makedirs(os.path.dirname(os.path.abspath(sFile)), mode=0o700, exist_ok=True)
+	browse._cacheWrite(sFile, sText)
+
+
+def writePathIndex(sFile, lRoots, dPaths):
+	"""Save a path index in the format read by the browse script
+
+	Args:
+		sFile: The output file
+		lRoots: Mirror URLs for the root catalog
+		dPaths: Catalog path -> dictionary from pathEntry()
+	"""
+	dHeader = {'version':2, 'generated':time.time(), 'roots':list(lRoots)}
+	lLines = [json.dumps(dHeader, ensure_ascii=False, sort_keys=True)]
+	for sPath in sorted(dPaths):
+		dEnt = dPaths[sPath]
+		lLines.append(json.dumps([
+			sPath, dEnt['parent'], dEnt['name'], dEnt['title'], dEnt['type'],
+			dEnt['urls']
+		], ensure_ascii=False))
+	writeIndexText(sFile, "%s\n"%"\n".join(lLines))
+
+
+##############################################################################
+# Term weights for each part of a node in the search index
+g_dFieldWeights = {
+	'name':3.0, 'title':2.0, 'variable':1.5, 'description':1.0, 'path':1.0
+}
+
+def searchEntry(sPath, dNode):
+	"""Get the search index entry for a single node
+
+	Names, titles, descriptions and catalog paths are indexed for all nodes,
+	variable names (and IDs) from the 'coordinates' and 'data' sections are
+	indexed for Collections.
+
+	Returns:
+		([path, name, title, type], dWeights) where dWeights maps each search
+		term to it's weight in this node.
+	"""
+	lFields = [ (sPath, g_dFieldWeights['path']) ]
+	for sField in ('name', 'title', 'description'):
+		if isinstance(dNode.get(sField), str):
+			lFields.append( (dNode[sField], g_dFieldWeights[sField]) )
+
+	if dNode.get('type') == 'Collection':
+		for sSection in ('coordinates', 'data'):
+			dVars = dNode.get(sSection, {})
+			for sVar in dVars:
+				sName = sVar
+				if isinstance(dVars[sVar], dict) and ('name' in dVars[sVar]):
+					sName = "%s %s"%(sVar, dVars[sVar]['name'])
+				lFields.append( (sName, g_dFieldWeights['variable']) )
+
+	dWeights = {}
+	for (sText, fWeight) in lFields:
+		for sTerm in browse.searchTerms(sText):
+			dWeights[sTerm] = dWeights.get(sTerm, 0.0) + fWeight
+
+	# Keep long descriptions from drowning out names and titles
+	for sTerm in dWeights:
+		dWeights[sTerm] = round(min(dWeights[sTerm], 6.0), 2)
+
+	lDoc = [
+		sPath, dNode.get('name', sPath), dNode.get('title', ''),
+		dNode.get('type', '')
+	]
+	return (lDoc, dWeights)
+
+
+def writeSearchIndex(sFile, lEntries):
+	"""Save a search index in the format read by the browse script
+
+	Args:
+		sFile: The output file
+		lEntries: A list of (lDoc, dWeights) tuples from searchEntry()
+	"""
+	lDocs = []
+	dTerms = {}
+	for (lDoc, dWeights) in sorted(lEntries, key=lambda t: t[0][0]):
+		iDoc = len(lDocs)
+		lDocs.append(lDoc)
+		for sTerm in dWeights:
+			dTerms.setdefault(sTerm, []).append( [iDoc, dWeights[sTerm]] )
+
+	dIndex = {
+		'version':1, 'generated':time.time(), 'docs':lDocs, 'terms':dTerms
+	}
+	writeIndexText(sFile, json.dumps(dIndex, ensure_ascii=False, sort_keys=True))
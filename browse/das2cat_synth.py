@@ -0,0 +1,285 @@
+#!/usr/bin/python3
+
+# Synthetic catalog generator for das2cat_cgi_browse.py, same license (MIT)
+# as the CGI script.
+#
+# Writes a made up federated catalog, with the same layout as this
+# repository's cat/ directory, for finding out how the browse script scales
+# to much larger catalogs than the real one.  The root, das and site
+# catalogs are followed by --depth levels of Catalogs with --fanout entries
+# each, the last level of Catalogs lists --fanout Collections and each
+# Collection has --sources HttpStreamSrc nodes with a HAPI style flag_set
+# of --flags on/off variables.  For example, about 10^5 nodes:
+#
+#    ./das2cat_synth.py -D 3 -f 10 -s 9 -F 10 /tmp/synth
+#    ./das2cat_bench.py -d /tmp/synth -p tag:das2.org,2012:site:/n0/n0/n0/c0/s0
+#
+# Every node is listed under --mirrors URLs.  Each of these is dead (points
+# to a file that doesn't exist) with a probability of --fail-rate, if all
+# of a node's mirrors are dead the node can't be reached.
+
+import sys
+import os
+import json
+import random
+import argparse
+
+import das2cat_cgi_browse as browse
+import das2cat_bench
+
+##############################################################################
+class Synth(object):
+	"""Synthetic catalog writer
+
+	Args:
+		sOutDir: Top directory for the catalog files
+		sBaseUrl: URL that sOutDir will be served from
+		nMirrors: Number of URLs listed for each node
+		fFailRate: Chance that any one mirror URL is dead
+		nSeed: Random number seed, the same seed gives the same catalog
+	"""
+
+	def __init__(self, sOutDir, sBaseUrl, nMirrors=2, fFailRate=0.0, nSeed=0):
+		self.sOutDir = sOutDir
+		self.sBaseUrl = sBaseUrl
+		self.nMirrors = max(nMirrors, 1)
+		self.fFailRate = fFailRate
+		self.rand = random.Random(nSeed)
+
+		self.dCounts = {
+			'Catalog':0, 'Collection':0, 'HttpStreamSrc':0, 'unreachable':0,
+			'bytes':0
+		}
+
+	def urls(self, sFile):
+		"""Get the mirror URLs for a node file, relative to the top directory.
+		Extra mirrors differ by a query string, which static servers ignore.
+		"""
+		lUrls = []
+		bLive = False
+		for i in range(self.nMirrors):
+			sQuery = "?mirror=%d"%i if i > 0 else ""
+			if self.rand.random() < self.fFailRate:
+				lUrls.append("%sdead/%s%s"%(self.sBaseUrl, sFile, sQuery))
+			else:
+				lUrls.append("%s%s%s"%(self.sBaseUrl, sFile, sQuery))
+				bLive = True
+		if not bLive: self.dCounts['unreachable'] += 1
+		return lUrls
+
+	def write(self, sFile, dNode):
+		sPath = os.path.join(self.sOutDir, sFile)
+		os.makedirs(os.path.dirname(sPath), exist_ok=True)
+		sText = json.dumps(dNode, ensure_ascii=False, indent=1, sort_keys=True)
+		with open(sPath, 'w', encoding='utf-8') as f:
+			f.write(sText)
+
+		self.dCounts[dNode['type']] += 1
+		self.dCounts['bytes'] += len(sText.encode('utf-8'))
+
+	def entry(self, sFile, dNode):
+		"""Write a node and return the parent's catalog entry for it"""
+		self.write(sFile, dNode)
+		return {
+			'name':dNode['name'], 'title':dNode['title'], 'type':dNode['type'],
+			'urls':self.urls(sFile)
+		}
+
+
+def _flagKey(i, nFlags):
+	return "%0*d"%(len(str(max(nFlags - 1, 0))), i)
+
+
+def synthSource(sName, nFlags):
+	"""Get a HAPI style HttpStreamSrc node with nFlags on/off variables, in
+	the protocol/interface layout read by prnHttpSource()
+	"""
+	dFlags = {}
+	dData = {}
+	for i in range(nFlags):
+		sKey = _flagKey(i, nFlags)
+		sVar = "Var_%s"%sKey
+		dFlags[sKey] = {'value':sVar, 'description':"Enable %s Output"%sVar}
+		dData[sVar.lower()] = {
+			'name':sVar, 'title':"Synthetic variable %s"%sKey,
+			'units':{'value':'counts'},
+			'enabled':{
+				'value':(i == 0),
+				'set':{'param':'parameters', 'flag':sKey, 'value':True}
+			}
+		}
+
+	dTimeParam = {
+		'type':'isotime', 'units':'UTC', 'required':True,
+		'title':"Minimum time value to stream", 'name':"Min Time"
+	}
+	dMaxParam = dict(dTimeParam, title="Maximum time value to stream",
+	                 name="Max Time")
+
+	return {
+		'type':'HttpStreamSrc', 'name':"%s HAPI Source"%sName,
+		'title':"Synthetic source %s"%sName, 'convention':'hapi/2.0',
+		'version':'0.4',
+		'format':{'default':{'mime':'application/vnd.hapi.stream', 'name':'Hapi Stream'}},
+		'protocol':{
+			'authentication':{'required':False},
+			'base_urls':["https://hapi.example.org/hapi/data?id=%s&include=header"%sName],
+			'http_params':{
+				'time.min':dTimeParam, 'time.max':dMaxParam,
+				'parameters':{
+					'type':'flag_set', 'flag_sep':',', 'required':True,
+					'title':"Data and Coordinate Columns to output",
+					'flags':dFlags
+				}
+			}
+		},
+		'interface':{
+			'coordinates':{
+				'time':{
+					'name':'Epoch', 'units':{'value':'UTC'},
+					'valid_min':'2000-001T00:00:00.000Z',
+					'valid_max':'2020-001T00:00:00.000Z',
+					'minimum':{
+						'value':'2010-001T00:00:00.000Z',
+						'set':{'param':'time.min', 'required':True}
+					},
+					'maximum':{
+						'value':'2010-002T00:00:00.000Z',
+						'set':{'param':'time.max', 'required':True}
+					}
+				}
+			},
+			'data':dData
+		}
+	}
+
+
+def _synthCollection(synth, sFile, sName, nSources, nFlags):
+	sDir = sFile[:-len('.json')]
+	dSources = {}
+	for i in range(nSources):
+		sKey = "s%d"%i
+		dSources[sKey] = synth.entry(
+			"%s/%s.json"%(sDir, sKey), synthSource("%s_%s"%(sName, sKey), nFlags)
+		)
+		dSources[sKey]['convention'] = 'hapi/2.0'
+
+	return synth.entry(sFile, {
+		'type':'Collection', 'name':sName, 'version':'0.4',
+		'title':"Synthetic collection %s"%sName,
+		'coordinates':{'time':{'name':'Epoch', 'units':'UTC'}},
+		'sources':dSources
+	})
+
+
+def _synthCatalog(synth, sFile, sName, nLevels, nFanout, nSources, nFlags):
+	sDir = sFile[:-len('.json')]
+	dCat = {}
+	for i in range(nFanout):
+		if nLevels > 1:
+			sKey = "n%d"%i
+			dCat[sKey] = _synthCatalog(
+				synth, "%s/%s.json"%(sDir, sKey), "%s_%s"%(sName, sKey),
+				nLevels - 1, nFanout, nSources, nFlags
+			)
+		else:
+			sKey = "c%d"%i
+			dCat[sKey] = _synthCollection(
+				synth, "%s/%s.json"%(sDir, sKey), "%s_%s"%(sName, sKey),
+				nSources, nFlags
+			)
+
+	return synth.entry(sFile, {
+		'type':'Catalog', 'name':sName, 'version':'0.4',
+		'title':"Synthetic catalog %s"%sName, 'catalog':dCat
+	})
+
+
+def synthesize(synth, nDepth, nFanout, nSources, nFlags):
+	"""Write a whole synthetic federation
+
+	Args:
+		synth: A Synth object
+		nDepth: Number of Catalog levels under the site catalog
+		nFanout: Number of entries in each of those Catalogs
+		nSources: Number of sources in each Collection
+		nFlags: Number of on/off variables in each source
+
+	Returns:
+		The catalog path of the first source, handy for das2cat_bench.py -p
+	"""
+	dSites = {}
+	for i in range(nFanout):
+		sKey = "n%d"%i
+		if nDepth > 0:
+			dSites[sKey] = _synthCatalog(
+				synth, "das/site/%s.json"%sKey, sKey, nDepth, nFanout, nSources,
+				nFlags
+			)
+		else:
+			dSites[sKey] = _synthCollection(
+				synth, "das/site/%s.json"%sKey, sKey, nSources, nFlags
+			)
+
+	dSite = synth.entry("das/site.json", {
+		'type':'Catalog', 'name':'Sites', 'version':'0.4', 'separator':':/',
+		'title':"Synthetic site catalog", 'catalog':dSites
+	})
+	dDas = synth.entry("das.json", {
+		'type':'Catalog', 'name':'das2', 'version':'0.4', 'separator':None,
+		'title':"Federated Das2 Catalog", 'catalog':{'site':dSite}
+	})
+	synth.write("index.json", {
+		'type':'Catalog', 'name':'Root', 'version':'0.4', 'separator':None,
+		'title':"Synthetic root catalog", 'catalog':{'tag:das2.org,2012:':dDas}
+	})
+
+	lPath = ["n0"]*nDepth + ["c0"] if nDepth > 0 else ["n0"]
+	if nSources > 0: lPath.append("s0")
+	return "tag:das2.org,2012:site:/%s"%"/".join(lPath)
+
+
+##############################################################################
+def main(argv):
+	psr = argparse.ArgumentParser(
+		description="Write a synthetic das2 federated catalog for scale testing"
+	)
+	psr.add_argument('out_dir', help="Output directory")
+	psr.add_argument('-D', '--depth', type=int, default=2,
+		help="Levels of Catalogs under the site catalog, defaults to %(default)s")
+	psr.add_argument('-f', '--fanout', type=int, default=10,
+		help="Entries in each Catalog, defaults to %(default)s")
+	psr.add_argument('-s', '--sources', type=int, default=2,
+		help="Sources in each Collection, defaults to %(default)s")
+	psr.add_argument('-F', '--flags', type=int, default=50,
+		help="On/off variables in each source, defaults to %(default)s")
+	psr.add_argument('-m', '--mirrors', type=int, default=2,
+		help="URLs listed for each node, defaults to %(default)s")
+	psr.add_argument('-r', '--fail-rate', type=float, default=0.0,
+		dest='fFailRate',
+		help="Chance that any one mirror URL is dead, defaults to %(default)s")
+	psr.add_argument('-u', '--url', default=das2cat_bench.g_sRepoCat,
+		help="URL the output directory will be served from, defaults to "+\
+		     "%(default)s which das2cat_bench.py serves locally")
+	psr.add_argument('--seed', type=int, default=0,
+		help="Random number seed, defaults to %(default)s")
+
+	opts = psr.parse_args(argv[1:])
+	sUrl = opts.url if opts.url.endswith('/') else opts.url + '/'
+
+	synth = Synth(opts.out_dir, sUrl, opts.mirrors, opts.fFailRate, opts.seed)
+	sSample = synthesize(
+		synth, max(opts.depth, 0), max(opts.fanout, 1), max(opts.sources, 0),
+		max(opts.flags, 0)
+	)
+
+	dCnt = synth.dCounts
+	browse.perr("%d Catalogs, %d Collections, %d sources, %d bytes written to %s"%(
+	            dCnt['Catalog'], dCnt['Collection'], dCnt['HttpStreamSrc'],
+	            dCnt['bytes'], opts.out_dir))
+	browse.perr("%d nodes have no live mirror"%dCnt['unreachable'])
+	browse.perr("First source: %s"%sSample)
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,148 @@
+#!/usr/bin/python3
+
+# Long running server front end for das2cat_cgi_browse.py, same license
+# (MIT) as the CGI script.
+#
+# The CGI script pays for interpreter startup, module imports and fetching
+# and parsing every catalog node on the way to the one requested, on every
+# hit.  This module wraps the same main() as a WSGI application so that all
+# of that happens once per process, and parsed nodes are kept in an LRU
+# cache between requests.
+#
+# Use under any WSGI container, for example:
+#
+#    gunicorn --threads 8 -b :8080 das2cat_wsgi:application
+#
+# or run stand-alone for testing:
+#
+#    ./das2cat_wsgi.py --port 8080 --node-cache 2048
+
+import sys
+import os
+import cgi
+import traceback
+import socketserver
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+
+import das2cat_cgi_browse as browse
+
+# Max number of parsed catalog nodes held in memory, may be overridden
+# by the environment variable DAS2CAT_NODE_CACHE or --node-cache
+g_nNodeCacheSize = 1024
+
+browse.g_nNodeCacheSize = int(
+	os.getenv('DAS2CAT_NODE_CACHE', str(g_nNodeCacheSize))
+)
+
+# Max number of rendered pages held in memory, DAS2CAT_PAGE_CACHE overrides
+g_nPageCacheSize = 256
+
+browse.g_nPageCacheSize = int(
+	os.getenv('DAS2CAT_PAGE_CACHE', str(g_nPageCacheSize))
+)
+
+# Max number of resolved catalog paths remembered, lookups start from the
+# deepest one above the wanted node.  DAS2CAT_LEARNED_PATHS overrides
+g_nLearnedPaths = 4096
+
+browse.g_nLearnedPaths = int(
+	os.getenv('DAS2CAT_LEARNED_PATHS', str(g_nLearnedPaths))
+)
+
+# Per-request timing records (JSON lines) go to the file named by
+# DAS2CAT_REQUEST_LOG, or standard error for '-'
+if os.getenv('DAS2CAT_REQUEST_LOG'):
+	browse.g_sRequestLog = os.getenv('DAS2CAT_REQUEST_LOG')
+
+# Prometheus metrics for this process are served at this path, set
+# DAS2CAT_METRICS_PATH to an empty string to turn them off
+g_sMetricsPath = os.getenv('DAS2CAT_METRICS_PATH', '/metrics')
+
+##############################################################################
+def application(environ, start_response):
+	"""WSGI entry point, runs browse.main() for a single request"""
+
+	# The browse code expects CGI variables, WSGI provides all of them except
+	# the HTTPS flag
+	dEnviron = dict(environ)
+	if environ.get('wsgi.url_scheme') == 'https':
+		dEnviron.setdefault('HTTPS', 'on')
+
+	if g_sMetricsPath and (environ.get('PATH_INFO') == g_sMetricsPath):
+		(sText, sType) = browse.metricsText()
+		(yBody, lHeaders) = browse.encodeResponse(
+			[sText], environ.get('HTTP_ACCEPT_ENCODING'), sType
+		)
+		start_response('200 OK', lHeaders)
+		return [yBody]
+
+	lOut = []
+	browse.beginRequest(dEnviron, lOut)
+	try:
+		form = cgi.FieldStorage(fp=environ.get('wsgi.input'), environ=dEnviron)
+		browse.main(form)
+	except Exception:
+		browse.endRequest()
+		environ['wsgi.errors'].write(traceback.format_exc())
+		start_response('500 Internal Server Error', [
+			('Content-Type', 'text/plain; charset=utf-8')
+		], sys.exc_info())
+		return [b'Internal error in das2 catalog browser, see server log\n']
+
+	dRec = browse.endRequest()
+
+	(yBody, lHeaders) = browse.encodeResponse(
+		lOut, environ.get('HTTP_ACCEPT_ENCODING'), dRec['type']
+	)
+	lHeaders.append( ('Server-Timing', browse.serverTiming(dRec)) )
+	start_response('200 OK', lHeaders)
+	return [yBody]
+
+
+##############################################################################
+class _ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+	daemon_threads = True
+
+class _QuietHandler(WSGIRequestHandler):
+	def log_message(self, format, *args):
+		pass
+
+def main(argv):
+	import argparse
+
+	psr = argparse.ArgumentParser(
+		description="Run the das2 catalog browser as a stand-alone web server"
+	)
+	psr.add_argument('-a', '--addr', default='127.0.0.1',
+		help="Address to listen on, defaults to %(default)s")
+	psr.add_argument('-p', '--port', type=int, default=8080,
+		help="Port to listen on, defaults to %(default)s")
+	psr.add_argument('-n', '--node-cache', type=int, dest='nNodes',
+		default=browse.g_nNodeCacheSize,
+		help="Max number of parsed catalog nodes to hold in memory, "+\
+		     "defaults to %(default)s")
+	psr.add_argument('-v', '--verbose', action='store_true',
+		help="Log each request to stderr")
+	psr.add_argument('-l', '--request-log', dest='sLog',
+		default=browse.g_sRequestLog,
+		help="Append a JSON timing record for each request to this file, "+\
+		     "use '-' for stderr")
+
+	opts = psr.parse_args(argv[1:])
+	browse.g_nNodeCacheSize = opts.nNodes
+	browse.g_sRequestLog = opts.sLog
+
+	handler = WSGIRequestHandler if opts.verbose else _QuietHandler
+	server = make_server(opts.addr, opts.port, application,
+	                     server_class=_ThreadingWSGIServer, handler_class=handler)
+
+	browse.perr("Serving das2 catalog browser on http://%s:%d/"%(
+	            opts.addr, opts.port))
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -1,11 +1,13 @@
+import json
+
 g_dTypes = {'integer':'integer', 'real':'real number'}
 def _inputFlagSet(sOpt, dInfo):
 	"""All the crazy das 2.2 overloaded parameter strings can flow though
 	this monstrosity of an input generator as well as the hapi data source
 	toggles.
 
-	Returns the name of a function to add to the list of functions called
-	on form submit, or None if nothing is to be called.
+	Returns a javascript call to add to the list of functions called on
+	form submit, or None if nothing is to be called.
 	"""
 	if 'FLAGS' not in dInfo:
 		pout('<p><span class="error">FLAGS value missing from catalog item.'
@@ -56,41 +58,11 @@ def _inputFlagSet(sOpt, dInfo):
 	sFlagSep = ' '
 	if 'FLAG_SEP' in dFlag: sFlagSep = dFlag['FLAG_SEP']
 
-	# And the Javascript that will set the actual field
-	sFlagCtrlIds = '["%s"]'%( '","'.join(lFlagSetIds))
-	sFlagTypes   = '["%s"]'%( '","'.join(lFlagSetType))
-	pout('''
-<script>
-var lFlagset_%s = %s;
-var lFlagType_%s = %s;
-var sFlagsetSep_%s = "%s";
-
-function update_flagset_%s() {
-	var lSelectedFlags = [];
-	var i = 0;
-	for(i = 0; i < lFlagset_%s.length; i++) {
-		if(lFlagType_%s[i] == "checkbox"){
-			// see if checkbox is checked for this flag
-			if(document.getElementById(lFlagset_%s[i]).checked) {
-				lSelectedFlags.push(document.getElementById(lFlagset_%s[i]).value);
-			}
-		}
-		else{
-			// see if text boxes are non-empty for this flag
-			if(document.getElementById(lFlagset_%s[i]).value.length > 0){
-				lSelectedFlags.push(document.getElementById(lFlagset_%s[i]).value);
-			}
-		}
-	}
-	// make a single string with all the flags
-	var sVal = lSelectedFlags.join(sFlagsetSep_%s);
-
-	// set the hidden field to have the combined value
-	document.getElementById("input_%s").value = sVal;
-}
-</script>
-	'''%(sOpt, sFlagCtrlIds, sOpt, sFlagTypes, sOpt, sFlagSep,
-	     sOpt, sOpt, sOpt, sOpt, sOpt, sOpt, sOpt, sOpt, sOpt)
-	)
+	# And the data for das2catFlagSet() in das2cat.js, which sets the actual
+	# field
+	dFlagSet = {'ids':lFlagSetIds, 'types':lFlagSetType, 'sep':sFlagSep}
+	sJson = json.dumps(dFlagSet, ensure_ascii=False, separators=(',',':'))
+	pout('<script type="application/json" id="flagset_%s">%s</script>'%(
+	     sOpt, sJson.replace('</', '<\\/')))
 
-	return "update_flagset_%s"%(sOpt)
+	return 'das2catFlagSet("%s")'%sOpt
@@ -0,0 +1,286 @@
+// Form handling for the das2 catalog browser (das2cat_cgi_browse.py), same
+// license (MIT) as the browse script.
+//
+// Data source forms are made of controls with no name, so they are never
+// sent as-is.  Each form is followed by a JSON data block with the id
+// FORMID_params holding the source's http_params, annotated with the ids of
+// the controls that feed each parameter (_inCtrlId, _inIfCtrlVal) and of the
+// hidden control that carries it (_outCtrlId).  On submit the parameter
+// values are assembled from the input controls and written to the named
+// output controls.
+//
+// Long lists of on/off variables are sent as JSON rows instead of HTML
+// (see _prnVarList in the browse script) and only the rows matching the
+// filter box are drawn, a page at a time.  The state of every row is kept
+// here, so rows that aren't drawn still count on submit.
+//
+// Collection pages may list their sources as closed <details> elements of
+// class das2cat_lazy.  The source form is fetched from the data-src URL the
+// first time one is opened.
+//
+// This file is static so that browsers can cache it, install it next to
+// style.css, see g_sScript in the browse script.
+
+var das2cat = {};
+
+// Parsed parameter blocks by form id
+das2cat.dForms = {};
+
+// Stand-in controls for list rows by control id
+das2cat.dRows = {};
+
+// Max number of list rows drawn at a time
+das2cat.nPage = 50;
+
+// Get an input control, drawn or not
+das2cat.ctrl = function(sId){
+	var ctrl = document.getElementById(sId);
+	if(ctrl) return ctrl;
+	if(sId in das2cat.dRows) return das2cat.dRows[sId];
+	return null;
+};
+
+// Draw the rows of a variable list that match it's filter text
+das2cat.drawList = function(elList, nMax){
+	var sFilter = elList.querySelector('input[type="search"]').value.toLowerCase();
+	var elBox = elList.querySelector('div');
+	var lRows = elList.das2catRows;
+
+	while(elBox.firstChild) elBox.removeChild(elBox.firstChild);
+
+	var nMatch = 0;
+	for(var i = 0; i < lRows.length; i++){
+		var row = lRows[i];
+		if((sFilter.length > 0) && (row.sText.indexOf(sFilter) == -1)) continue;
+		nMatch += 1;
+		if(nMatch > nMax) continue;
+
+		var elP = document.createElement('p');
+		var elIn = document.createElement('input');
+		elIn.type = 'checkbox';
+		elIn.id = row.id;
+		elIn.value = row.value;
+		elIn.checked = row.checked;
+		elIn.addEventListener('change', function(){
+			das2cat.dRows[this.id].checked = this.checked;
+		});
+		var elName = document.createElement('b');
+		elName.textContent = row.sName;
+		elP.appendChild(elIn);
+		elP.appendChild(elName);
+		elP.appendChild(document.createTextNode(' - ' + row.sInfo));
+		elBox.appendChild(elP);
+	}
+
+	if(nMatch > nMax){
+		var elMore = document.createElement('button');
+		elMore.type = 'button';
+		elMore.textContent = 'Show ' + Math.min(nMatch - nMax, das2cat.nPage) +
+		                     ' more of ' + (nMatch - nMax);
+		elMore.addEventListener('click', function(){
+			das2cat.drawList(elList, nMax + das2cat.nPage);
+		});
+		elBox.appendChild(elMore);
+	}
+};
+
+// Setup all the variable lists under an element
+das2cat.initLists = function(elRoot){
+	var lLists = elRoot.querySelectorAll('div.das2cat_vlist');
+	for(var i = 0; i < lLists.length; i++){
+		var elList = lLists[i];
+		if(elList.das2catRows) continue;
+
+		var lData = JSON.parse(document.getElementById(elList.id + "_rows").textContent);
+		var lRows = [];
+		for(var j = 0; j < lData.length; j++){
+			var row = {
+				id:lData[j][0], type:'checkbox', value:lData[j][1], checked:lData[j][2],
+				sName:lData[j][3], sInfo:lData[j][4],
+				getAttribute:function(sAttr){ return this[sAttr]; }
+			};
+			row.sText = (row.sName + ' ' + row.sInfo).toLowerCase();
+			das2cat.dRows[row.id] = row;
+			lRows.push(row);
+		}
+		elList.das2catRows = lRows;
+
+		elList.querySelector('input[type="search"]').addEventListener('input',
+			function(){ das2cat.drawList(this.closest('div.das2cat_vlist'), das2cat.nPage); }
+		);
+		das2cat.drawList(elList, das2cat.nPage);
+	}
+};
+
+das2cat.params = function(sFormId){
+	if(!(sFormId in das2cat.dForms)){
+		var elData = document.getElementById(sFormId + "_params");
+		das2cat.dForms[sFormId] = elData ? JSON.parse(elData.textContent) : {};
+	}
+	return das2cat.dForms[sFormId];
+};
+
+// Add one flag value to a flag_set output string
+das2cat.addFlag = function(sOutVal, sOutSep, sFlag){
+	if((sOutSep.length > 0)&&(sOutVal.length > 0)) sOutVal += sOutSep;
+	return sOutVal + sFlag;
+};
+
+// Build the value of a flag_set parameter from it's input controls
+das2cat.flagSetValue = function(dParam){
+	var dFlags = dParam['flags'];
+	var sOutVal = "";
+	var sOutSep = " ";
+	if('flag_sep' in dParam) sOutSep = dParam['flag_sep'];
+
+	for(var sFlag in dFlags){
+		var dFlag = dFlags[sFlag];
+		if( !('_inCtrlId' in dFlag) ) continue;
+
+		var ctrlIn = das2cat.ctrl(dFlag["_inCtrlId"]);
+		if(!ctrlIn) continue;
+
+		// Check to see if we only add the output flag when the input
+		// has a certian value
+		if( '_inIfCtrlVal' in dFlag ){
+			if(ctrlIn.type == 'checkbox'){
+				// If the state of the checkbox matches the send state then add the
+				// parameter.  This might mean than NOT checked sends a value.
+				if(dFlag['_inIfCtrlVal'] == ctrlIn.checked)
+					sOutVal = das2cat.addFlag(sOutVal, sOutSep, dFlag['value']);
+			}
+			else{
+				if(ctrlIn.value == dFlag['_inIfCtrlVal'])
+					sOutVal = das2cat.addFlag(sOutVal, sOutSep, dFlag['value']);
+			}
+		}
+		else{
+			// So the input sets the whole flag only set the output if something
+			// has changed.
+			var sPre = ('prefix' in dFlag) ? dFlag['prefix'] : "";
+			if(ctrlIn.type == 'checkbox'){
+				if(ctrlIn.checked == true)
+					sOutVal = das2cat.addFlag(sOutVal, sOutSep, sPre + dFlag['value']);
+			}
+			else{
+				if(ctrlIn.value.length > 0)
+					sOutVal = das2cat.addFlag(sOutVal, sOutSep, sPre + ctrlIn.value);
+			}
+		}
+	}
+	return sOutVal;
+};
+
+// Set the output controls for a form and point it at sActionUrl.
+//
+// sNamePre is stripped from output control ids to get the parameter name.
+// It was added to keep controls from different forms separate.
+function das2catSubmit(sFormId, sNamePre, sActionUrl){
+	var dParams = das2cat.params(sFormId);
+
+	for(var sParam in dParams){
+		var dParam = dParams[sParam];
+
+		if(!("_outCtrlId" in dParam)) continue;
+		var ctrlOut = document.getElementById(dParam["_outCtrlId"]);
+		var sOutName = dParam["_outCtrlId"].replace(sNamePre, "");
+
+		// Flagset parameters, the most complicated ones
+		if( ('type' in dParam) && (dParam['type'] == 'flag_set')){
+			if( !('flags' in dParam) ) continue;
+
+			var sOutVal = das2cat.flagSetValue(dParam);
+
+			// Set control name and value if value changed
+			if(sOutVal.length > 0){
+				ctrlOut.name = sOutName;
+				ctrlOut.value = sOutVal;
+			}
+		}
+
+		// TODO: Enum parameters
+
+		// Generic parameters
+		else {
+			if(!("_inCtrlId" in dParam)) continue;
+			var ctrlIn = das2cat.ctrl(dParam["_inCtrlId"]);
+
+			if(ctrlIn.getAttribute("type") == "checkbox"){
+				if(ctrlIn.checked == true){
+					ctrlOut.value = ctrlIn.value;
+					ctrlOut.name = sOutName;
+				}
+			}
+			else {
+				if(ctrlIn.value.length > 0){
+					ctrlOut.value = ctrlIn.value;
+					ctrlOut.name = sOutName;
+				}
+			}
+		}
+	}
+
+	document.getElementById(sFormId).action = sActionUrl;
+}
+
+// Combine the controls of an older style FLAGS list into it's hidden input,
+// see _inputFlagSet() in params_function_save.py
+function das2catFlagSet(sOpt){
+	var elData = document.getElementById("flagset_" + sOpt);
+	if(!elData) return;
+	var dSet = JSON.parse(elData.textContent);
+
+	var lSelectedFlags = [];
+	for(var i = 0; i < dSet['ids'].length; i++){
+		var ctrl = document.getElementById(dSet['ids'][i]);
+		if(dSet['types'][i] == "checkbox"){
+			if(ctrl.checked) lSelectedFlags.push(ctrl.value);
+		}
+		else{
+			if(ctrl.value.length > 0) lSelectedFlags.push(ctrl.value);
+		}
+	}
+	document.getElementById("input_" + sOpt).value = lSelectedFlags.join(dSet['sep']);
+}
+
+// Load a lazy source form, replacing everything after the <summary>
+das2cat.loadSource = function(elDetails){
+	if(elDetails.das2catLoading) return;
+	elDetails.das2catLoading = true;
+
+	var elBody = document.createElement('div');
+	elBody.textContent = 'Loading...';
+	while(elDetails.lastChild && (elDetails.lastChild.tagName != 'SUMMARY'))
+		elDetails.removeChild(elDetails.lastChild);
+	elDetails.appendChild(elBody);
+
+	fetch(elDetails.getAttribute('data-src')).then(function(resp){
+		if(!resp.ok) throw new Error('HTTP status ' + resp.status);
+		return resp.text();
+	}).then(function(sHtml){
+		elBody.innerHTML = sHtml;
+		das2cat.initLists(elBody);
+	}).catch(function(err){
+		elBody.textContent = 'Could not load this source: ' + err.message;
+		elDetails.das2catLoading = false;
+	});
+};
+
+das2cat.initLazy = function(elRoot){
+	var lLazy = elRoot.querySelectorAll('details.das2cat_lazy');
+	for(var i = 0; i < lLazy.length; i++){
+		lLazy[i].addEventListener('toggle', function(){
+			if(this.open) das2cat.loadSource(this);
+		});
+	}
+};
+
+das2cat.init = function(){
+	das2cat.initLists(document);
+	das2cat.initLazy(document);
+};
+
+if(document.readyState == 'loading')
+	document.addEventListener('DOMContentLoaded', das2cat.init);
+else
+	das2cat.init();
@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+
+# Tests for the compact in-memory node storage of das2cat_cgi_browse.py,
+# same license (MIT) as the CGI script.  Run with:
+#
+#    python3 -m unittest test_das2cat_compact
+
+import gc
+import unittest
+
+import das2cat_cgi_browse as browse
+
+def _node(i):
+	"""A Collection with one sub-object of it's own and one shared by all"""
+	return {
+		'type':'Collection', 'name':"c%d"%i, 'title':"Collection %d"%i,
+		'coordinates':{'time':{'name':'Epoch', 'units':'UTC'}},
+		'sources':{'s0':{'urls':["https://example.org/c%d/s0.json"%i]}}
+	}
+
+class SharedPoolTest(unittest.TestCase):
+
+	def setUp(self):
+		self.nSaveSize = browse.g_nNodeCacheSize
+		browse.g_nNodeCacheSize = 10
+		with browse.g_lruLock:
+			browse.g_dNodeLru.clear()
+		gc.collect()
+
+	def tearDown(self):
+		browse.g_nNodeCacheSize = self.nSaveSize
+		with browse.g_lruLock:
+			browse.g_dNodeLru.clear()
+
+	def test_shared(self):
+		dA = browse.compactNode(_node(1))
+		dB = browse.compactNode(_node(2))
+		self.assertIs(dA['coordinates'], dB['coordinates'])
+		self.assertIsNot(dA['sources'], dB['sources'])
+
+	def test_pool_shrinks_on_eviction(self):
+		nBefore = len(browse.g_dSharedObjs)
+		for i in range(2000):
+			browse._lruPut("https://example.org/c%d.json"%i, _node(i), {})
+		gc.collect()
+
+		# Only the nodes still in the LRU keep their sub-objects, 10 nodes
+		# with 3 of their own each plus the shared coordinates
+		self.assertEqual(len(browse.g_dNodeLru), 10)
+		self.assertLessEqual(len(browse.g_dSharedObjs) - nBefore, 10*3 + 2)
+
+		with browse.g_lruLock:
+			browse.g_dNodeLru.clear()
+		gc.collect()
+		self.assertEqual(len(browse.g_dSharedObjs), nBefore)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+
+# Tests for the upstream HTTP handling of das2cat_cgi_browse.py, same
+# license (MIT) as the CGI script.  Run with:
+#
+#    python3 -m unittest test_das2cat_http
+
+import time
+import socket
+import threading
+import unittest
+
+import das2cat_cgi_browse as browse
+
+class StalledHostTest(unittest.TestCase):
+
+	def setUp(self):
+		# Accepts connections (in the backlog) but never answers
+		self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		self.sock.bind(('127.0.0.1', 0))
+		self.sock.listen(32)
+		self.sUrl = "http://127.0.0.1:%d/index.json"%self.sock.getsockname()[1]
+		self.nSavePool = browse.g_nPoolSize
+		browse.g_nPoolSize = 2
+
+	def tearDown(self):
+		browse.g_nPoolSize = self.nSavePool
+		self.sock.close()
+
+	def test_waiting_for_a_connection_counts_against_the_timeout(self):
+		lTimes = []
+		lock = threading.Lock()
+
+		def fetch():
+			fBeg = time.time()
+			with self.assertRaises(Exception):
+				browse._httpGet(self.sUrl, {}, 1.0)
+			with lock:
+				lTimes.append(time.time() - fBeg)
+
+		lThreads = [threading.Thread(target=fetch) for i in range(6)]
+		for thread in lThreads: thread.start()
+		for thread in lThreads: thread.join()
+
+		# Four of the six find the host's two connections busy, they should
+		# still give up after one second, not queue up behind the others
+		self.assertEqual(len(lTimes), 6)
+		self.assertLess(max(lTimes), 1.5)
+
+if __name__ == '__main__':
+	unittest.main()